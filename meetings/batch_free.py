@@ -0,0 +1,96 @@
+"""
+Offline free-time reports from exported calendar dumps.
+
+Each input line is one user's dump, a JSON object:
+
+    {"user": "...", "start": iso, "end": iso, "events": [...]}
+
+where events are shaped like the app's event records (at least 'start'
+and 'end').  "calendars": [[...], [...]] may be given instead of
+"events" to get the free time common to several calendars.  start
+and end may be left out if --start and --end are given.
+
+Users are spread across a process pool and results are written, in
+input order, as one JSON line per user:
+
+    {"user": "...", "free": [[iso_start, iso_end], ...]}
+
+or {"user": "...", "error": "..."}.  Only a bounded window of users
+is in flight at a time, so memory does not grow with the input.
+
+    python3 batch_free.py dumps/*.jsonl -o report.jsonl --workers 8
+"""
+import argparse
+import collections
+import concurrent.futures
+import fileinput
+import json
+import logging
+import os
+import sys
+
+from free_times import calculate_free, calculate_free_merged
+
+def free_record(line, start=None, end=None):
+	"""
+	The output line (JSON text) for one input line.
+	"""
+	user = None
+	try:
+		record = json.loads(line)
+		user = record.get('user')
+		range_start = record.get('start', start)
+		range_end = record.get('end', end)
+		if range_start is None or range_end is None:
+			raise ValueError("no start or end for the range")
+		if 'calendars' in record:
+			free = calculate_free_merged(record['calendars'], range_start, range_end)
+		else:
+			free = calculate_free(record.get('events', []), range_start, range_end)
+		result = {'user': user, 'free': free}
+	except Exception as error:
+		result = {'user': user, 'error': "{}: {}".format(type(error).__name__, error)}
+	return json.dumps(result, separators=(',', ':'))
+
+def run_batch(lines, workers=None, window=None, start=None, end=None):
+	"""
+	Yield the output line of each input line, in order, computing
+	them on a pool of workers processes.  At most window lines
+	(4 per worker by default) are in flight at once.
+	"""
+	workers = workers or os.cpu_count() or 1
+	window = window or 4 * workers
+	with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+		pending = collections.deque()
+		for line in lines:
+			if not line.strip():
+				continue
+			pending.append(pool.submit(free_record, line, start, end))
+			if len(pending) >= window:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Compute free times from JSONL calendar dumps")
+	parser.add_argument('dumps', nargs='*', default=['-'],
+		help="JSONL dump files ('-' or none for standard input)")
+	parser.add_argument('-o', '--output', help="write results here instead of standard output")
+	parser.add_argument('--workers', type=int, help="worker processes (default: one per core)")
+	parser.add_argument('--window', type=int, help="users in flight at once (default: 4 per worker)")
+	parser.add_argument('--start', help="range start for dumps that don't give one")
+	parser.add_argument('--end', help="range end for dumps that don't give one")
+	args = parser.parse_args(argv)
+
+	output = open(args.output, 'w') if args.output else sys.stdout
+	try:
+		with fileinput.input(args.dumps) as lines:
+			for result in run_batch(lines, args.workers, args.window, args.start, args.end):
+				output.write(result + "\n")
+	finally:
+		if args.output:
+			output.close()
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
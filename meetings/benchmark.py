@@ -0,0 +1,193 @@
+"""
+Benchmarks for the free-time pipeline.
+
+Times each stage -- parsing events as the event store does, time_order,
+calculate_free and template rendering -- on synthetic calendars of
+several sizes, and reports throughput and peak memory.  Results can
+be saved as JSON and compared against a stored baseline:
+
+    python3 benchmark.py --save bench.json
+    python3 benchmark.py --baseline bench.json   # exits 1 on regression
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import arrow
+import flask
+
+from calendar_fetch import event_record
+from formatting import register_filters
+from free_times import calculate_free, calculate_free_daily, wall_seconds, window_filter
+from intervals import Event, Timeline
+
+SIZES = [100, 1000, 10000]
+DURATIONS = [15, 30, 45, 60, 90, 120]    # minutes
+RANGE_START = '2017-11-06T00:00:00-08:00'
+
+def synthetic_items(count, days=7, overlap=0.2, all_day=0.05, seed=0, start=RANGE_START):
+	"""
+	count Calendar API event resources spread over days days from
+	start, sorted by start as events.list returns them.  overlap is
+	the fraction of events placed inside the one before; all_day the
+	fraction of all-day events.
+	"""
+	rng = random.Random(seed)
+	base = arrow.get(start)
+	spacing = days * 86400 // max(count, 1)
+	items = []
+	previous = None
+	for n in range(count):
+		if rng.random() < all_day:
+			day = base.shift(days=rng.randrange(days))
+			items.append({'kind': 'calendar#event', 'id': 'e{}'.format(n),
+				'summary': 'All day {}'.format(n),
+				'start': {'date': day.format('YYYY-MM-DD')},
+				'end': {'date': day.shift(days=1).format('YYYY-MM-DD')}})
+			continue
+		if previous is not None and rng.random() < overlap:
+			e_start = previous.shift(minutes=rng.randrange(0, 60))
+		else:
+			e_start = base.shift(seconds=n * spacing + rng.randrange(0, max(spacing, 1)))
+		e_end = e_start.shift(minutes=rng.choice(DURATIONS))
+		previous = e_start
+		items.append({'kind': 'calendar#event', 'id': 'e{}'.format(n),
+			'summary': 'Event {}'.format(n), 'description': 'Synthetic event',
+			'start': {'dateTime': e_start.isoformat()},
+			'end': {'dateTime': e_end.isoformat()}})
+	items.sort(key=lambda item: item['start'].get('dateTime', item['start'].get('date')))
+	return items
+
+def render_app():
+	"""
+	A bare Flask app with the meetings templates and filters.
+	"""
+	app = flask.Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
+	app.secret_key = 'benchmark'
+	register_filters(app)
+	return app
+
+def stages(items, days, app):
+	"""
+	(name, function) for each pipeline stage, each function running
+	the stage on what the stages before it produced.
+	"""
+	state = {}
+	start = arrow.get(RANGE_START)
+	end = start.shift(days=days)
+	first_day = wall_seconds(RANGE_START) // 86400
+	last_day = first_day + days - 1
+
+	def list_events():
+		state['events'] = Timeline(Event.from_record(event_record(item)) for item in items)
+
+	def time_order():
+		state['busy'] = list(window_filter(state['events'], first_day, last_day, 9 * 3600, 17 * 3600))
+
+	def free():
+		calculate_free(state['busy'], start.isoformat(), end.isoformat())
+
+	def free_daily():
+		state['free'] = calculate_free_daily([state['busy']], first_day, last_day,
+			9 * 3600, 17 * 3600, start.tzinfo)
+
+	def render():
+		with app.test_request_context('/display'):
+			flask.g.busy_events = [state['busy']]
+			flask.g.free_events = [state['free']]
+			flask.render_template('index.html')
+
+	return [('list_events', list_events), ('time_order', time_order),
+		('calculate_free', free), ('calculate_free_daily', free_daily),
+		('render', render)]
+
+def run_benchmarks(sizes=SIZES, days=7, overlap=0.2, all_day=0.05, repeat=3):
+	"""
+	Time every stage at every size.  Returns
+	{stage: {size: {'seconds', 'events_per_second', 'peak_kib'}}},
+	seconds being the best of repeat runs.
+	"""
+	results = {}
+	app = render_app()
+	for size in sizes:
+		items = synthetic_items(size, days, overlap, all_day)
+		timings = {}
+		for attempt in range(repeat):
+			for name, stage in stages(items, days, app):
+				begin = time.perf_counter()
+				stage()
+				elapsed = time.perf_counter() - begin
+				timings[name] = min(elapsed, timings.get(name, elapsed))
+		# memory on a separate pass: tracing slows everything down
+		peaks = {}
+		for name, stage in stages(items, days, app):
+			tracemalloc.start()
+			stage()
+			peaks[name] = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+		for name, seconds in timings.items():
+			results.setdefault(name, {})[str(size)] = {
+				'seconds': seconds,
+				'events_per_second': size / seconds if seconds else None,
+				'peak_kib': peaks[name] // 1024}
+	return results
+
+def regressions(results, baseline, tolerance=1.5):
+	"""
+	Descriptions of stages and sizes that took more than tolerance
+	times their baseline seconds.
+	"""
+	slower = []
+	for name, sizes in results.items():
+		for size, result in sizes.items():
+			before = baseline.get(name, {}).get(size)
+			if before and result['seconds'] > before['seconds'] * tolerance:
+				slower.append("{} at {} events: {:.4f}s, baseline {:.4f}s".format(
+					name, size, result['seconds'], before['seconds']))
+	return slower
+
+def report(results):
+	lines = ["{:<22}{:>8}{:>12}{:>16}{:>12}".format(
+		'stage', 'events', 'seconds', 'events/s', 'peak KiB')]
+	for name, sizes in results.items():
+		for size, result in sizes.items():
+			lines.append("{:<22}{:>8}{:>12.4f}{:>16.0f}{:>12}".format(
+				name, size, result['seconds'], result['events_per_second'] or 0,
+				result['peak_kib']))
+	return "\n".join(lines)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmark the free-time pipeline")
+	parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+		help="event counts to run (default: %(default)s)")
+	parser.add_argument('--days', type=int, default=7, help="length of the range in days")
+	parser.add_argument('--overlap', type=float, default=0.2, help="fraction of overlapping events")
+	parser.add_argument('--all-day', type=float, default=0.05, help="fraction of all-day events")
+	parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the best counts")
+	parser.add_argument('--save', help="write results to this JSON file")
+	parser.add_argument('--baseline', help="JSON results to compare against")
+	parser.add_argument('--tolerance', type=float, default=1.5,
+		help="slowdown over the baseline that counts as a regression")
+	args = parser.parse_args(argv)
+
+	results = run_benchmarks(args.sizes, args.days, args.overlap, args.all_day, args.repeat)
+	print(report(results))
+	if args.save:
+		with open(args.save, 'w') as output:
+			json.dump(results, output, indent=2, sort_keys=True)
+	if args.baseline:
+		with open(args.baseline) as baseline:
+			slower = regressions(results, json.load(baseline), args.tolerance)
+		for line in slower:
+			print("REGRESSION: " + line, file=sys.stderr)
+		if slower:
+			return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,127 @@
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def fetch_calendars(fetch, cal_ids, max_workers=8, timeout=10.0, executor=None):
+	"""
+	Call fetch(cal_id) for every calendar, at most max_workers at a
+	time.
+
+	Returns a list of (cal_id, result, error) in the order of cal_ids.
+	error is None on success; otherwise result is None and error is the
+	exception raised, or a TimeoutError if the calendar did not answer
+	within timeout seconds of its fetch starting.  One slow or
+	failing calendar only loses its own result.
+
+	executor, if given, is a long-lived ThreadPoolExecutor to run on
+	instead of a pool made for this call, so per-thread state (such
+	as service objects) outlives the call.  A calendar still waiting
+	for one of its threads timeout seconds after being handed to it
+	times out too.
+	"""
+	cal_ids = list(cal_ids)
+	results = dict((result[0], result) for result in
+		iter_calendars(fetch, cal_ids, max_workers, timeout, executor))
+	return [results[cal_id] for cal_id in cal_ids]
+
+def iter_calendars(fetch, cal_ids, max_workers=8, timeout=10.0, executor=None):
+	"""
+	Like fetch_calendars, but yields each (cal_id, result, error) as
+	soon as that calendar is done, so callers can start on the first
+	calendars while later ones are still being fetched.
+	"""
+	waiting = collections.deque(cal_ids)
+	if not waiting:
+		return
+	workers = min(max_workers, len(waiting))
+	pool = executor
+	if pool is None:
+		pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+	# future: (cal_id, [time handed to the pool, then time started])
+	running = {}
+
+	def submit(cal_id):
+		clock = [time.monotonic()]
+		def timed():
+			clock[0] = time.monotonic()
+			return fetch(cal_id)
+		running[pool.submit(timed)] = (cal_id, clock)
+
+	try:
+		while waiting or running:
+			# calendars past max_workers wait here, their clocks not started
+			while waiting and len(running) < workers:
+				submit(waiting.popleft())
+			deadline = min(clock[0] for _, clock in running.values()) + timeout
+			done, _ = concurrent.futures.wait(running, max(0, deadline - time.monotonic()),
+				concurrent.futures.FIRST_COMPLETED)
+			for future in done:
+				cal_id, _ = running.pop(future)
+				try:
+					result = future.result()
+				except Exception as error:
+					logger.warning("Calendar %s failed: %s", cal_id, error)
+					yield cal_id, None, error
+				else:
+					yield cal_id, result, None
+			now = time.monotonic()
+			for future, (cal_id, clock) in list(running.items()):
+				if now - clock[0] >= timeout and not future.done():
+					# stop waiting; the thread is freed when its call returns
+					future.cancel()
+					del running[future]
+					logger.warning("Calendar %s timed out", cal_id)
+					yield cal_id, None, TimeoutError(cal_id)
+	finally:
+		for future in running:
+			future.cancel()
+		# don't hold the request up waiting for timed-out calls
+		if executor is None:
+			pool.shutdown(wait=False)
+
+def per_thread(factory):
+	"""
+	Return a function giving each thread its own factory() object.
+	Google service objects (and the httplib2.Http under them) are not
+	thread-safe, so pool threads must not share one.
+	"""
+	local = threading.local()
+	def get():
+		if not hasattr(local, 'value'):
+			local.value = factory()
+		return local.value
+	return get
+
+# Partial-response projections (fields=) for the list calls: only
+# what event_record, the recurrence expansion and list_calendars read
+EVENT_FIELDS = ("items(kind,id,etag,updated,status,summary,description,start,end,"
+	"recurrence,recurringEventId,originalStartTime),nextPageToken,nextSyncToken")
+CALENDAR_FIELDS = "items(kind,id,summary,description,selected,primary),nextPageToken"
+
+def event_record(event):
+	"""
+	The dict we keep for a busy event, from a Calendar API event
+	resource.
+	"""
+	if "start" not in event:
+		start = "(no start)"
+		end = "(no end)"
+	elif "dateTime" not in event["start"]:
+		start = event["start"]["date"]
+		end = event["end"]["date"]
+	else:
+		start = event["start"]["dateTime"]
+		end = event["end"]["dateTime"]
+	return { "kind": event["kind"],
+		"id": event["id"],
+		"etag": event.get("etag"),
+		"updated": event.get("updated"),
+		"summary": event.get("summary", "(no summary)"),
+		"description": event.get("description", "(no description)"),
+		"start": start,
+		"end": end
+		}
@@ -0,0 +1,130 @@
+"""
+On-disk columnar store for large calendars.
+
+Rooms and shared resources can have years of history and tens of
+thousands of events; as Events (or worse, dicts) that is a lot of
+memory in every gunicorn worker.  ColumnStore keeps each calendar in
+one .npy file of int64 columns sorted by start:
+
+    start, end     busy time, epoch seconds
+    offset         UTC offset of the event's timezone at its start
+    reach          running maximum of end
+
+Files are memory-mapped read-only, so workers share the page cache
+rather than each holding a copy, and a range query is two binary
+searches (reach is sorted, so events that started before the range
+but run into it are found too).  busy() merges the events in range
+with numpy and hands the free-time engine one Interval per busy
+block, never one object per event:
+
+    store = ColumnStore('/var/cache/meetings/columns')
+    store.write(cal_id, events)
+    free = calculate_free_daily([store.busy(cal_id, lo, hi)], ...)
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from formatting import fixed_zone
+from intervals import Interval
+from lru_cache import LRUCache
+
+START, END, OFFSET, REACH = range(4)
+
+class ColumnStore:
+	"""
+	Calendars as memory-mapped int64 columns in directory, one file
+	per key.  Writes replace the file atomically, so readers in other
+	processes see either the old or the new columns.  At most maxmaps
+	files stay mapped, the least recently used unmapped first.
+	"""
+	def __init__(self, directory, maxmaps=256):
+		self.directory = directory
+		os.makedirs(directory, exist_ok=True)
+		self._maps = LRUCache(maxsize=maxmaps)
+		self._lock = threading.Lock()
+
+	def path(self, key):
+		return os.path.join(self.directory,
+			hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npy')
+
+	def write(self, key, events):
+		"""
+		Store events (Intervals, such as EventStore.events returns)
+		as key's columns, replacing what was there.
+		"""
+		events = list(events)
+		columns = np.empty((4, len(events)), dtype=np.int64)
+		for n, event in enumerate(events):
+			columns[START, n] = event.start
+			columns[END, n] = event.end
+			columns[OFFSET, n] = event.wall(event.start) - event.start
+		columns = columns[:, np.argsort(columns[START], kind='stable')]
+		np.maximum.accumulate(columns[END], out=columns[REACH])
+		descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+		try:
+			with os.fdopen(descriptor, 'wb') as output:
+				np.save(output, columns)
+			os.replace(temporary, self.path(key))
+		except:
+			os.unlink(temporary)
+			raise
+
+	def columns(self, key):
+		"""
+		key's (4, n) column array, memory-mapped, or None if key was
+		never written.  Maps are reused until the file is replaced.
+		"""
+		path = self.path(key)
+		try:
+			stat = os.stat(path)
+		except FileNotFoundError:
+			return None
+		version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+		with self._lock:
+			mapped = self._maps.get(path)
+			if mapped is None or mapped[0] != version:
+				mapped = (version, np.load(path, mmap_mode='r'))
+				self._maps.put(path, mapped)
+		return mapped[1]
+
+	def count(self, key):
+		columns = self.columns(key)
+		return 0 if columns is None else columns.shape[1]
+
+	def select(self, key, start, end):
+		"""
+		(starts, ends, offsets) arrays of key's events overlapping
+		start to end (epoch seconds), sorted by start.
+		"""
+		columns = self.columns(key)
+		if columns is None:
+			empty = np.empty(0, dtype=np.int64)
+			return empty, empty, empty
+		first = np.searchsorted(columns[REACH], start, side='right')
+		last = np.searchsorted(columns[START], end, side='left')
+		window = columns[:, first:last]
+		# some events before the latest-ending one end before start
+		keep = window[END] > start
+		return window[START][keep], window[END][keep], window[OFFSET][keep]
+
+	def busy(self, key, start, end):
+		"""
+		Yield key's busy time overlapping start to end as disjoint
+		Intervals sorted by start, each shown in the timezone of its
+		first event, the way merge_intervals would.
+		"""
+		starts, ends, offsets = self.select(key, start, end)
+		if not len(starts):
+			return
+		reach = np.maximum.accumulate(ends)
+		# a block starts where an event starts after everything before it ended
+		opens = np.flatnonzero(np.concatenate(([True], starts[1:] > reach[:-1])))
+		closes = np.append(opens[1:] - 1, len(starts) - 1)
+		for block_start, block_end, offset in zip(starts[opens].tolist(),
+				reach[closes].tolist(), offsets[opens].tolist()):
+			yield Interval(block_start, block_end, fixed_zone(offset))
@@ -0,0 +1,218 @@
+import contextlib
+import json
+import logging
+import sqlite3
+import time
+
+from calendar_fetch import EVENT_FIELDS, event_record
+from intervals import Event, Timeline
+from lru_cache import LRUCache
+from recurrence import expand_items, trim_item
+
+logger = logging.getLogger(__name__)
+
+class MemoryBackend:
+	"""
+	Keeps calendar state in this process, at most maxsize calendars.
+	"""
+	def __init__(self, maxsize=256):
+		self.cache = LRUCache(maxsize=maxsize)
+
+	def get(self, key):
+		return self.cache.get(key)
+
+	def put(self, key, sync_token, events):
+		self.cache.put(key, (sync_token, events))
+
+	def delete(self, key):
+		self.cache.pop(key)
+
+class SQLiteBackend:
+	"""
+	Keeps calendar state in an SQLite file, so gunicorn workers can
+	share it.  At most maxsize calendars are kept; the least recently
+	used ones are dropped first.
+	"""
+	def __init__(self, path, maxsize=1024):
+		self.path = path
+		self.maxsize = maxsize
+		with self._connect() as db:
+			db.execute("CREATE TABLE IF NOT EXISTS calendars ("
+				"key TEXT PRIMARY KEY, sync_token TEXT, events TEXT, used REAL)")
+
+	@contextlib.contextmanager
+	def _connect(self):
+		"""
+		A connection for one transaction, closed afterwards.
+		"""
+		db = sqlite3.connect(self.path, timeout=10)
+		try:
+			with db:
+				yield db
+		finally:
+			db.close()
+
+	def get(self, key):
+		with self._connect() as db:
+			row = db.execute("SELECT sync_token, events FROM calendars WHERE key = ?",
+				(key,)).fetchone()
+			if row is None:
+				return None
+			db.execute("UPDATE calendars SET used = ? WHERE key = ?", (time.time(), key))
+		return row[0], json.loads(row[1])
+
+	def put(self, key, sync_token, events):
+		with self._connect() as db:
+			db.execute("INSERT OR REPLACE INTO calendars VALUES (?, ?, ?, ?)",
+				(key, sync_token, json.dumps(events), time.time()))
+			db.execute("DELETE FROM calendars WHERE key IN ("
+				"SELECT key FROM calendars ORDER BY used DESC LIMIT -1 OFFSET ?)",
+				(self.maxsize,))
+
+	def delete(self, key):
+		with self._connect() as db:
+			db.execute("DELETE FROM calendars WHERE key = ?", (key,))
+
+class EventStore:
+	"""
+	Per-calendar event cache kept current with Calendar API sync
+	tokens.  The first request for a key lists all of the calendar's
+	events; later requests only fetch what changed since, and apply
+	those deltas to the stored events.
+
+	With expand_recurring, recurring events are listed once
+	(singleEvents=False) and their instances in the query's timeMin
+	to timeMax are expanded here (see recurrence.py), rather than
+	each instance being sent by Google.
+
+	With columns (a column_store.ColumnStore), busy() keeps each
+	calendar's times on disk instead of as a Timeline in memory.
+	"""
+	def __init__(self, backend=None, expand_recurring=False, maxsize=256, columns=None):
+		self.backend = backend if backend is not None else MemoryBackend()
+		self.expand_recurring = expand_recurring
+		# parsed Timelines by key, with the sync token they are current for
+		self.timelines = LRUCache(maxsize=maxsize)
+		self.columns = columns
+		# sync token the columns were last written for, by key
+		self.written = LRUCache(maxsize=maxsize)
+
+	def events(self, service, cal_id, key, **list_args):
+		"""
+		The calendar's events as a Timeline of Events (sorted by
+		start, epoch starts alongside).  The Timeline is reused until
+		a sync brings changes, so events are parsed once.  key identifies this
+		user's view of the calendar over this query (list_args, such
+		as timeMin and timeMax, which only apply to the first,
+		full listing).
+		"""
+		key, previous, sync_token, events = self._sync(service, cal_id, key, list_args)
+		cached = self.timelines.get(key)
+		if previous is not None and cached is not None and cached[0] == previous:
+			# nothing changed since this process last parsed them
+			if sync_token != previous:
+				self.backend.put(key, sync_token, events)
+				self.timelines.put(key, (sync_token, cached[1]))
+			return cached[1]
+		self.backend.put(key, sync_token, events)
+		timeline = self._timeline(events, list_args)
+		self.timelines.put(key, (sync_token, timeline))
+		return timeline
+
+	def busy(self, service, cal_id, key, start, end, **list_args):
+		"""
+		The calendar's busy time overlapping start to end (epoch
+		seconds) as disjoint Intervals, read from the columns (see
+		ColumnStore.busy).  Events are synced as for events(); the
+		columns are rewritten when a sync brings changes, and no
+		Timeline is kept.
+		"""
+		key, previous, sync_token, events = self._sync(service, cal_id, key, list_args)
+		if previous is None or self.written.get(key) != previous:
+			self.backend.put(key, sync_token, events)
+			self.columns.write(key, self._timeline(events, list_args))
+			self.written.put(key, sync_token)
+		elif sync_token != previous:
+			self.backend.put(key, sync_token, events)
+			self.written.put(key, sync_token)
+		return self.columns.busy(key, start, end)
+
+	def _sync(self, service, cal_id, key, list_args):
+		"""
+		(key, previous, sync_token, events): key's stored events (by
+		ID) brought up to date, and the sync token to store with them.
+		previous is the stored sync token if the sync brought no
+		changes, else None.  Nothing is stored yet.
+		"""
+		single = not self.expand_recurring
+		if not single:
+			# stored state holds recurring events, not instances
+			key = "recurring " + key
+		state = self.backend.get(key)
+		if state is not None and state[0] is None:
+			state = None
+		if state is not None:
+			try:
+				items, sync_token = self._list(service, calendarId=cal_id,
+					syncToken=state[0], singleEvents=single, showDeleted=True)
+				events = dict(state[1])
+			except Exception as error:
+				if not is_gone(error):
+					raise
+				# token expired on Google's side: start over
+				logger.info("Sync token for %s expired", cal_id)
+				self.backend.delete(key)
+				state = None
+		if state is None:
+			items, sync_token = self._list(service, calendarId=cal_id,
+				singleEvents=single, **list_args)
+			events = {}
+		for item in items:
+			if single:
+				if item.get("status") == "cancelled":
+					events.pop(item["id"], None)
+				else:
+					events[item["id"]] = event_record(item)
+			elif item.get("status") == "cancelled" and "recurringEventId" not in item:
+				events.pop(item["id"], None)
+			else:
+				# cancelled instances are kept: they are holes in their series
+				events[item["id"]] = trim_item(item)
+		previous = state[0] if state is not None and not items else None
+		return key, previous, sync_token, events
+
+	def _timeline(self, events, list_args):
+		"""
+		Timeline of the stored events (by ID), recurring ones expanded
+		over list_args' timeMin to timeMax.
+		"""
+		if not self.expand_recurring:
+			records = events.values()
+		else:
+			records = (event_record(item) for item in expand_items(events.values(),
+				list_args.get('timeMin'), list_args.get('timeMax')))
+		return Timeline(Event.from_record(record) for record in records
+			if record["start"] != "(no start)")
+
+	def _list(self, service, **query):
+		"""
+		All items of an events.list query, across pages, and the
+		sync token that comes with the last page.
+		"""
+		items = []
+		page_token = None
+		while True:
+			page = service.events().list(pageToken=page_token, fields=EVENT_FIELDS,
+				**query).execute()
+			items.extend(page.get("items", []))
+			page_token = page.get("nextPageToken")
+			if not page_token:
+				return items, page.get("nextSyncToken")
+
+def is_gone(error):
+	"""
+	True for the HTTP 410 the Calendar API sends when a sync token
+	is no longer valid.
+	"""
+	response = getattr(error, 'resp', None)
+	return getattr(response, 'status', None) == 410
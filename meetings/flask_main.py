@@ -4,23 +4,48 @@ from flask import request
 from flask import url_for
 import uuid
 
+import concurrent.futures
+import hashlib
 import json
 import logging
+import threading
 
 # Date handling 
 import arrow # Replacement for datetime, based on moment.js
-# import datetime # But we still need time
+import datetime # But we still need time
 from dateutil import tz  # For interpreting local times
 
 
+# The Google client libraries are slow to import and only the OAuth
+# and calendar routes need them: they are imported on first use
+# (see startup.py), or up front by warm().  HTTP goes through
+# http_pool rather than httplib2.
+from startup import LazyModule
 # OAuth2  - Google library implementation for convenience
-from oauth2client import client
-import httplib2   # used in oauth2 flow
+client = LazyModule('oauth2client.client')
 
 # Google API for services 
-from apiclient import discovery
+discovery = LazyModule('apiclient.discovery')
 # Free Times
-from free_times import calculate_free
+from free_times import iter_free_daily
+from free_times import wall_seconds, window_filter, MAX_OFFSET
+# Concurrent calendar fetching
+from calendar_fetch import fetch_calendars, iter_calendars, CALENDAR_FIELDS
+# Keep-alive connections to Google shared by all requests
+from http_pool import ConnectionPool, PooledHttp
+# Service object cache
+from lru_cache import LRUCache
+# Incremental event cache
+from event_store import EventStore, MemoryBackend, SQLiteBackend
+# Memoized busy and free times
+from free_cache import FreeTimeCache
+# Server-side sessions
+from session_store import ServerSideSessionInterface
+from session_store import SQLiteSessionBackend
+# Template filters
+from formatting import register_filters, parse_clock, parse_us_datetime
+# Per-request stage timing, served at /metrics
+from metrics import REGISTRY, instrument, span
 
 ###
 # Globals
@@ -35,10 +60,64 @@ app = flask.Flask(__name__)
 app.debug=CONFIG.DEBUG
 app.logger.setLevel(logging.DEBUG)
 app.secret_key=CONFIG.SECRET_KEY
+instrument(app)
+# Set SESSION_STORE in the configuration to an SQLite file path to
+# keep session contents on the server, shared between gunicorn
+# workers, with only an ID in the cookie.  Otherwise Flask's signed
+# cookie sessions are used, which need no shared state.
+if getattr(CONFIG, 'SESSION_STORE', None):
+  app.session_interface = ServerSideSessionInterface(
+    SQLiteSessionBackend(CONFIG.SESSION_STORE))
 
 SCOPES = 'https://www.googleapis.com/auth/calendar.readonly'
 CLIENT_SECRET_FILE = CONFIG.GOOGLE_KEY_FILE  ## You'll need this
 APPLICATION_NAME = 'MeetMe class project'
+CALENDAR_FETCH_WORKERS = 8    # threads one request fetches calendars on
+CALENDAR_FETCH_THREADS = 32   # threads all requests share
+CALENDAR_FETCH_TIMEOUT = 10   # seconds before a calendar is skipped
+
+# Calendar API discovery document and service objects are reused
+# across requests instead of rebuilt on each one
+DISCOVERY_DOCUMENT = None
+# Set DISCOVERY_URL in the configuration to use another calendar
+# API, such as the local stand-in in loadtest.py
+DISCOVERY_URL = getattr(CONFIG, 'DISCOVERY_URL', None)
+DISCOVERY_LOCK = threading.Lock()
+DISCOVERY_STATS = {'hits': 0, 'misses': 0}
+# Service objects aren't thread-safe: each thread keeps its own, by
+# access token.  /display fetches on the long-lived FETCH_EXECUTOR
+# threads, so their services are reused from request to request.
+# A request keeps at most CALENDAR_FETCH_WORKERS of them busy, and
+# its Google calls give up after CALENDAR_FETCH_TIMEOUT, so slow
+# calendars can't hold the pool from other users for long.
+SERVICES = threading.local()
+SERVICE_STATS = {'hits': 0, 'misses': 0}
+SERVICE_LOCK = threading.Lock()
+FETCH_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+  max_workers=CALENDAR_FETCH_THREADS, thread_name_prefix='calendar-fetch')
+# Connections to Google, reused by every service object and thread
+HTTP_POOL = ConnectionPool(maxsize=CALENDAR_FETCH_THREADS)
+# Busy and free times, reused while calendars and range don't change
+FREE_CACHE = FreeTimeCache()
+
+# Events per calendar, kept current with sync tokens.  Set
+# EVENT_STORE in the configuration to an SQLite file path to
+# share it between gunicorn workers.  Set EXPAND_RECURRING to
+# fetch recurring events once and expand their instances here.
+EXPAND_RECURRING = getattr(CONFIG, 'EXPAND_RECURRING', False)
+# Set COLUMN_STORE to a directory to keep busy times for /api/free
+# in memory-mapped files there (see column_store.py), shared by the
+# workers, rather than as parsed events in each of them.
+if getattr(CONFIG, 'COLUMN_STORE', None):
+  from column_store import ColumnStore
+  COLUMN_STORE = ColumnStore(CONFIG.COLUMN_STORE)
+else:
+  COLUMN_STORE = None
+if getattr(CONFIG, 'EVENT_STORE', None):
+  EVENT_STORE = EventStore(SQLiteBackend(CONFIG.EVENT_STORE), EXPAND_RECURRING,
+    columns=COLUMN_STORE)
+else:
+  EVENT_STORE = EventStore(MemoryBackend(), EXPAND_RECURRING, columns=COLUMN_STORE)
 
 #############################
 #
@@ -69,9 +148,11 @@ def choose():
 
     gcal_service = get_gcal_service(credentials)
     app.logger.debug("Returned from get_gcal_service")
-    flask.g.calendars = list_calendars(gcal_service)
-    flask.session['calendars'] = list_calendars(gcal_service)
-    return render_template('index.html')
+    with span('list_calendars'):
+      flask.g.calendars = list_calendars(gcal_service)
+    flask.session['calendars'] = flask.g.calendars
+    with span('render_template'):
+      return render_template('index.html')
 
 
 @app.route("/display", methods=["POST"])
@@ -82,7 +163,7 @@ def display():
     this far in the process
     """
     app.logger.debug("In the 'display' function")
-    cal_service = get_gcal_service(valid_credentials())
+    credentials = valid_credentials()
 
     # repopulate calendars list
     flask.g.calendars = flask.session['calendars']
@@ -93,21 +174,167 @@ def display():
     flask.g.thin_free_events = []
     # gets the selected checkBoxes' ids
     checkBox_id_list = flask.request.form.getlist("calendar")
-    for cal_id in checkBox_id_list:
-      # get calendar's events
-      events = list_events(cal_service, cal_id)
+    bounds = session_bounds()
+    with span('fetch_calendars'):
+      fetched = list(selected_events(credentials, checkBox_id_list, bounds))
+    contributions = []
+    for cal_id, contribution, error in fetched:
+      if error is not None:
+        flask.flash("Calendar '{}' could not be loaded".format(cal_id))
+        continue
+      contributions.append(contribution)
+      flask.g.busy_events.append(contribution[1])
+
+    # free times shared by all selected calendars, in one pass,
+    # inside each day's begin_time..end_time window
+    with span('calculate_free'):
+      free_events = FREE_CACHE.free(contributions, bounds, tz.tzlocal())
+    app.logger.debug("free_events: " + str(free_events))
+    flask.g.free_events.append(free_events)
+
+    with span('render_template'):
+      return render_template('index.html')
+
+
+@app.route("/api/busy", methods=["GET", "POST"])
+def api_busy():
+    """
+    Busy times of the selected calendars ('calendar' parameters,
+    as for /display) as newline-delimited JSON.  Each calendar's
+    events are sent as soon as that calendar has been fetched.
+    """
+    credentials = valid_credentials()
+    if not credentials:
+      return flask.jsonify(error="not authorized"), 401
+    if not has_range():
+      return flask.jsonify(error="no date range chosen (see /setrange)"), 400
+    cal_ids = flask.request.values.getlist("calendar")
+    bounds = session_bounds()
+
+    def busy_lines():
+      for cal_id, contribution, error in selected_events(credentials, cal_ids,
+          bounds, in_order=False):
+        if error is not None:
+          yield ndjson({"calendar": cal_id, "error": str(error) or type(error).__name__})
+          continue
+        for event in contribution[1]:
+          yield ndjson({"calendar": cal_id, "id": event.id,
+            "summary": event.summary, "start": event["start"],
+            "end": event["end"]})
+
+    return flask.Response(flask.stream_with_context(busy_lines()),
+      mimetype='application/x-ndjson')
+
+
+@app.route("/api/free", methods=["GET", "POST"])
+def api_free():
+    """
+    Free times shared by the selected calendars ('calendar'
+    parameters, as for /display) as newline-delimited JSON.
+    Each free time is sent as soon as the sweep finds it.  If any
+    calendar fails, only its error line is sent and no free times:
+    time free in the others may be busy in it.
+    """
+    credentials = valid_credentials()
+    if not credentials:
+      return flask.jsonify(error="not authorized"), 401
+    if not has_range():
+      return flask.jsonify(error="no date range chosen (see /setrange)"), 400
+    cal_ids = flask.request.values.getlist("calendar")
+    bounds = session_bounds()
+
+    def free_lines():
+      busy = []
+      failed = False
+      for cal_id, merged, error in selected_busy(credentials, cal_ids, bounds):
+        if error is not None:
+          failed = True
+          yield ndjson({"calendar": cal_id, "error": str(error) or type(error).__name__})
+        else:
+          busy.append(merged)
+      if failed:
+        return
+      for free in iter_free_daily(busy, *bounds, tzinfo=tz.tzlocal()):
+        start, end = free.isoformat()
+        yield ndjson({"start": start, "end": end})
+
+    return flask.Response(flask.stream_with_context(free_lines()),
+      mimetype='application/x-ndjson')
+
+
+def ndjson(record):
+    return json.dumps(record, separators=(',', ':')) + "\n"
+
+
+def selected_busy(credentials, cal_ids, bounds):
+    """
+    Yields (cal_id, busy, error) for each calendar as soon as it is
+    fetched; busy is its busy time as disjoint Intervals.  With
+    COLUMN_STORE set it is read from the columns and covers every
+    event in the range's days, including ones that run past them;
+    otherwise it is the merged events time_order keeps (see
+    selected_events).
+    """
+    if COLUMN_STORE is None:
+      for cal_id, contribution, error in selected_events(credentials, cal_ids,
+          bounds, in_order=False):
+        yield cal_id, contribution and contribution[2], error
+      return
+    time_min = flask.session.get('begin_datetime', flask.session['begin_date'])
+    time_max = flask.session.get('end_datetime', flask.session['end_date'])
+    user_key = credentials_key(credentials)
+    # bounds are wall-clock days: widen them to every timezone's
+    lowest = bounds[0] * 86400 - MAX_OFFSET
+    highest = (bounds[1] + 1) * 86400 + MAX_OFFSET
+    def fetch(cal_id):
+      service = get_gcal_service(credentials)
+      with span('fetch_busy'):
+        return list(EVENT_STORE.busy(service, cal_id,
+          "{} {} {} {}".format(user_key, cal_id, time_min, time_max),
+          lowest, highest, timeMin=time_min, timeMax=time_max))
+
+    for result in iter_calendars(fetch, cal_ids,
+        CALENDAR_FETCH_WORKERS, CALENDAR_FETCH_TIMEOUT, FETCH_EXECUTOR):
+      yield result
+
+
+def selected_events(credentials, cal_ids, bounds, in_order=True):
+    """
+    Yields (cal_id, contribution, error) for each calendar, its
+    events fetched concurrently (through the sync-token cache).
+    contribution is FREE_CACHE.busy's (key, busy, merged): the
+    events time_order keeps and their merged busy Intervals,
+    reused while the calendar and range don't change.  With
+    in_order False calendars come out as soon as they are fetched.
+    Must run in a request context (it reads the session).
+    """
+    # only ask Google for events in the chosen range
+    time_min = flask.session.get('begin_datetime', flask.session['begin_date'])
+    time_max = flask.session.get('end_datetime', flask.session['end_date'])
+    user_key = credentials_key(credentials)
+    def fetch(cal_id):
+      service = get_gcal_service(credentials)
+      with span('fetch_events'):
+        return EVENT_STORE.events(service, cal_id,
+          "{} {} {} {}".format(user_key, cal_id, time_min, time_max),
+          timeMin=time_min, timeMax=time_max)
+
+    if in_order:
+      fetched = fetch_calendars(fetch, cal_ids,
+        CALENDAR_FETCH_WORKERS, CALENDAR_FETCH_TIMEOUT, FETCH_EXECUTOR)
+    else:
+      fetched = iter_calendars(fetch, cal_ids,
+        CALENDAR_FETCH_WORKERS, CALENDAR_FETCH_TIMEOUT, FETCH_EXECUTOR)
+    for cal_id, events, error in fetched:
+      if error is not None:
+        yield cal_id, None, error
+        continue
       app.logger.debug("events: ")
       app.logger.debug(events)
       # get events in correct time
-      order = time_order(events)
-      flask.g.busy_events.append(order)
-
-      free_events = calculate_free(order, flask.session['begin_datetime'], flask.session['end_datetime'])
-      
-      app.logger.debug("free_events: " + str(free_events))
-      flask.g.free_events.append(free_events)
-    
-    return render_template('index.html')
+      with span('time_order'):
+        contribution = FREE_CACHE.busy(user_key, cal_id, events, bounds)
+      yield cal_id, contribution, None
 
 
 ####
@@ -149,6 +376,8 @@ def valid_credentials():
     if 'credentials' not in flask.session:
       return None
 
+    # a fresh object per request: a token refresh mutates it in place,
+    # so one shared between requests and threads would go stale
     credentials = client.OAuth2Credentials.from_json(
         flask.session['credentials'])
 
@@ -158,6 +387,15 @@ def valid_credentials():
     return credentials
 
 
+def credentials_key(credentials):
+  """
+  Stable, non-secret key for the user the credentials belong to.
+  The refresh token outlives access tokens, so prefer it.
+  """
+  token = credentials.refresh_token or credentials.access_token
+  return hashlib.sha1(token.encode('utf-8')).hexdigest()
+
+
 def get_gcal_service(credentials):
   """
   We need a Google calendar 'service' object to obtain
@@ -169,11 +407,86 @@ def get_gcal_service(credentials):
   Then the second call will succeed without additional authorization.
   """
   app.logger.debug("Entering get_gcal_service")
-  http_auth = credentials.authorize(httplib2.Http())
-  service = discovery.build('calendar', 'v3', http=http_auth)
+  # Service objects aren't thread-safe, so each thread gets its own
+  services = getattr(SERVICES, 'cache', None)
+  if services is None:
+    services = SERVICES.cache = LRUCache(maxsize=8, ttl=600)
+  key = credentials.access_token
+  service = services.get(key)
+  with SERVICE_LOCK:
+    SERVICE_STATS['misses' if service is None else 'hits'] += 1
+  if service is None:
+    with span('discovery_build'):
+      # authorize patches the PooledHttp, not the shared pool
+      http_auth = credentials.authorize(
+        PooledHttp(HTTP_POOL, timeout=CALENDAR_FETCH_TIMEOUT))
+      service = discovery.build_from_document(
+        discovery_document(), http=http_auth)
+    services.put(key, service)
   app.logger.debug("Returning service")
   return service
 
+
+def discovery_document():
+  """
+  The calendar v3 discovery document, fetched once per process.
+  discovery.build would fetch and parse it on every request.
+  """
+  global DISCOVERY_DOCUMENT
+  with DISCOVERY_LOCK:
+    if DISCOVERY_DOCUMENT is None:
+      DISCOVERY_STATS['misses'] += 1
+      uri = DISCOVERY_URL or discovery.DISCOVERY_URI.format(
+        api='calendar', apiVersion='v3')
+      response, content = HTTP_POOL.request(uri)
+      if response.status >= 400:
+        raise IOError("Couldn't fetch discovery document: {}".format(
+          response.status))
+      DISCOVERY_DOCUMENT = json.loads(content.decode('utf-8'))
+    else:
+      DISCOVERY_STATS['hits'] += 1
+    return DISCOVERY_DOCUMENT
+
+
+def warm():
+  """
+  Import the Google client libraries, fetch the discovery document
+  and compile the page template now rather than on first use.  With
+  PRELOAD in the configuration this runs at import, so under
+  gunicorn --preload it is done once, before workers are forked.
+  """
+  for module in (client, discovery):
+    module.load()
+  try:
+    discovery_document()
+  except Exception as error:
+    # no network yet: the first calendar request will fetch it
+    app.logger.warning("Couldn't preload discovery document: {}".format(error))
+  app.jinja_env.get_template('index.html')
+  # don't hand the discovery fetch's connection to forked workers
+  HTTP_POOL.clear()
+
+
+@app.route("/metrics")
+def metrics():
+  """
+  Stage and request latency histograms and request counters,
+  in the Prometheus text format.
+  """
+  return flask.Response(REGISTRY.exposition(),
+    mimetype='text/plain; version=0.0.4')
+
+
+@app.route("/cachestats")
+def cachestats():
+  """
+  Hit and miss counters of the discovery document and
+  service object caches.
+  """
+  return flask.jsonify(discovery=DISCOVERY_STATS,
+    services=SERVICE_STATS, free_times=FREE_CACHE.stats(),
+    connections=HTTP_POOL.stats())
+
 @app.route('/oauth2callback')
 def oauth2callback():
   """
@@ -207,7 +520,10 @@ def oauth2callback():
     ## we got the 'code' argument in the URL.
     app.logger.debug("Code was in flask.request.args")
     auth_code = flask.request.args.get('code')
-    credentials = flow.step2_exchange(auth_code)
+    credentials = flow.step2_exchange(auth_code, http=PooledHttp(HTTP_POOL))
+    # signing in: don't keep a session ID that existed before
+    if hasattr(flask.session, 'regenerate'):
+      flask.session.regenerate()
     flask.session['credentials'] = credentials.to_json()
     ## Now I can build the service and execute the query,
     ## but for the moment I'll just log it and go back to
@@ -292,6 +608,9 @@ def interpret_time( text ):
     case it will also flash a message explaining accepted formats.
     """
     app.logger.debug("Decoding time '{}'".format(text))
+    clock = parse_clock(text)
+    if clock is not None:
+        return datetime.datetime(2016, 1, 1, *clock, tzinfo=tz.tzlocal()).isoformat()
     time_formats = ["ha", "h:mma",  "h:mm a", "H:mm", "hh:mm a"]
     try: 
         as_arrow = arrow.get(text, time_formats).replace(tzinfo=tz.tzlocal())
@@ -332,6 +651,12 @@ def interpret_datetime( text ):
   Convert date and time text to ISO format with local timezone.
   """
   app.logger.debug("Decoding time '{}'".format(text))
+  fields = parse_us_datetime(text)
+  if fields is not None:
+      try:
+          return datetime.datetime(*fields, tzinfo=tz.tzlocal()).isoformat()
+      except ValueError:
+          pass
   date_time_formats = ["MM/DD/YYYY ha", "MM/DD/YYYY h:mma",  "MM/DD/YYYY h:mm a", "MM/DD/YYYY H:mm", "MM/DD/YYYY hh:mm a"]
   try: 
         as_arrow = arrow.get(text, date_time_formats).replace(tzinfo=tz.tzlocal())
@@ -357,90 +682,35 @@ def next_day(isotext):
 #  Functions (NOT pages) that return some information
 #
 ####
-def time_order(events):
+def time_order(events, bounds=None):
   """
-  Returns list of events that fit between 
+  Yields the events that fit between 
   a given start and end time.
+  bounds is from session_bounds(); pass it in to
+  parse the session's range only once per request.
   """
-  ordered_events = []
-
-  big_start_date = arrow.get(flask.session["begin_date"]).replace(tzinfo='US/Pacific').date()
-  big_end_date = arrow.get(flask.session["end_date"]).replace(tzinfo='US/Pacific').date()
-
-  big_start_time = arrow.get(flask.session["begin_time"]).replace(tzinfo='US/Pacific').time()
-  big_end_time = arrow.get(flask.session["end_time"]).replace(tzinfo='US/Pacific').time()
-  
-  for event in events:
-    e_start = event['start']
-    e_end = event['end']
-
-    e_start_time = arrow.get(e_start).replace(tzinfo='US/Pacific').time()
-    e_end_time = arrow.get(e_end).replace(tzinfo='US/Pacific').time()
-    e_start_date = arrow.get(e_start).replace(tzinfo='US/Pacific').date()
-    e_end_date = arrow.get(e_end).replace(tzinfo='US/Pacific').date()
-
-    date_range = e_end_date <= big_end_date and e_start_date >= big_start_date
-    
-    before_lap = e_start_time < big_start_time and e_end_time > big_start_time and date_range
-    after_lap = e_end_time > big_end_time and e_start_time < big_end_time and date_range
-    during = e_end_time <= big_end_time and e_start_time >= big_start_time and date_range
-
-    if ((before_lap or after_lap or during) and date_range):
-      ordered_events.append(event)
-
-  return ordered_events
+  if bounds is None:
+    bounds = session_bounds()
+  return window_filter(events, *bounds)
 
-def list_events(service, cal_id):
+def has_range():
   """
-  Returns a list of dicts (busy events)
-
+  Whether the session holds a date and time range (set by
+  /setrange, or the defaults /index fills in).
   """
-  app.logger.debug("Entering list_events")  
-  event_list = service.events().list(
-      calendarId=cal_id, 
-      #sortBy='startTime',
-      #timeMin=flask.session["begin_time"],
-      #timeMax=flask.session["end_time"],
-      singleEvents=True
-  ).execute()["items"]
-
-  result = [ ]
-  for event in event_list:
-    kind = event["kind"]
-    id = event["id"]
-    if "description" in event: 
-      desc = event["description"]
-    else:
-      desc = "(no description)"
-    if "summary" in event:
-      summary = event["summary"]
-    else:
-      summary = "(no summary)"
-    if "start" not in event:
-      start = "(no start)"
-    else:
-      if "dateTime" not in event["start"]:
-        start = event["start"]["date"]
-        end = event["end"]["date"]
-        
-      else:
-        start = event["start"]["dateTime"]
-        end = event["end"]["dateTime"]
+  return all(key in flask.session
+    for key in ('begin_date', 'end_date', 'begin_time', 'end_time'))
 
-    result.append(
-      { "kind": kind,
-        "id": id,
-        "summary": summary,
-        "description": desc,
-        "start": start,
-        "end": end
-        })
-
-  return sorted(result, key=event_sort_key)
-
-
-def event_sort_key( event ):
-  return event["start"]
+def session_bounds():
+  """
+  The session's date range as day numbers and its daily
+  time range as seconds of the day, in wall-clock time
+  (see free_times.wall_seconds).
+  """
+  return (wall_seconds(flask.session["begin_date"]) // 86400,
+    wall_seconds(flask.session["end_date"]) // 86400,
+    wall_seconds(flask.session["begin_time"]) % 86400,
+    wall_seconds(flask.session["end_time"]) % 86400)
 
 def list_calendars(service):
     """
@@ -451,7 +721,8 @@ def list_calendars(service):
     Google Calendars web app) calendars before unselected calendars.
     """
     app.logger.debug("Entering list_calendars")  
-    calendar_list = service.calendarList().list().execute()["items"]
+    calendar_list = service.calendarList().list(
+        fields=CALENDAR_FIELDS).execute()["items"]
     result = [ ]
     for cal in calendar_list:
         kind = cal["kind"]
@@ -501,30 +772,14 @@ def cal_sort_key( cal ):
 #
 #################
 
-@app.template_filter( 'fmtdate' )
-def format_arrow_date( date ):
-    try: 
-        normal = arrow.get( date, "yyyy-mm-dd" )
-        return normal.format("ddd MM/DD/YYYY")
-    except:
-        return "(bad date)"
+# The filters live in formatting.py so they can be used
+# (and benchmarked) without this app
+register_filters(app)
 
-@app.template_filter( 'fmttime' )
-def format_arrow_time( time ):
-    try:
-        normal = arrow.get( time )
-        return normal.format("HH:mm")
-    except:
-        return "(bad time)"
+# Set PRELOAD in the configuration to warm up at import (see warm)
+if getattr(CONFIG, 'PRELOAD', False):
+  warm()
 
-@app.template_filter( 'fmtdateTime' )
-def format_arrow_dateTime( dateTime ):
-  try:
-    normal = arrow.get(dateTime)
-    return normal.format("MM/DD/YYYY HH:mm")
-  except:
-    return "(bad dateTime)"
-    
 #############
 
 
@@ -0,0 +1,167 @@
+import arrow
+import calendar
+import datetime
+import re
+
+from dateutil import tz
+
+#################
+#
+# Parsing and formatting of dates and times
+#
+#################
+
+# RFC 3339 timestamps, as the Calendar API sends them, and plain dates
+RFC3339 = re.compile(r'(\d{4})-(\d{2})-(\d{2})'
+	r'(?:[T ](\d{2}):(\d{2}):(\d{2})(?:\.\d+)?(Z|[+-]\d{2}:?\d{2})?)?$')
+# Times of day as the range form takes them: 9am, 1:30pm, 1:30 pm, 13:30
+CLOCK = re.compile(r'\s*(\d{1,2})(?::(\d{2}))?\s*([aApP][mM])?\s*$')
+# Dates as the range form takes them: 12/31/2017
+US_DATE = re.compile(r'\s*(\d{2})/(\d{2})/(\d{4})\s+(.*)$')
+
+# One shared tzinfo per UTC offset
+ZONES = {}
+
+def fixed_zone(offset):
+	"""
+	Shared tzinfo for a UTC offset in seconds.
+	"""
+	shared = ZONES.get(offset)
+	if shared is None:
+		shared = ZONES.setdefault(offset,
+			tz.tzutc() if offset == 0 else tz.tzoffset(None, offset))
+	return shared
+
+def zone(tzinfo, moment=None):
+	"""
+	Shared fixed-offset tzinfo for tzinfo's offset at moment.
+	Zones with DST rules (which aren't fixed offsets) are kept as is.
+	"""
+	if not isinstance(tzinfo, (tz.tzoffset, tz.tzutc, datetime.timezone)):
+		return tzinfo
+	return fixed_zone(int(tzinfo.utcoffset(moment).total_seconds()))
+
+def epoch(moment):
+	"""
+	Integer seconds since the epoch for an arrow (or datetime) object.
+	"""
+	return calendar.timegm(moment.utctimetuple())
+
+def parse_timestamp(text):
+	"""
+	(epoch seconds, tzinfo) for an ISO/RFC 3339 timestamp or date.
+	The forms the Calendar API sends are parsed with one regular
+	expression; anything else goes through arrow.get.  Like
+	arrow.get, dates and timestamps without an offset are UTC.
+	"""
+	match = RFC3339.match(text) if isinstance(text, str) else None
+	if match is None:
+		moment = arrow.get(text)
+		return epoch(moment), zone(moment.tzinfo, moment.datetime)
+	year, month, day, hour, minute, second, offset = match.groups()
+	if hour is None:
+		fields = (int(year), int(month), int(day), 0, 0, 0)
+	else:
+		fields = (int(year), int(month), int(day), int(hour), int(minute), int(second))
+	if offset is None or offset == 'Z':
+		offset_seconds = 0
+	else:
+		digits = offset[1:].replace(':', '')
+		offset_seconds = int(digits[:2]) * 3600 + int(digits[2:]) * 60
+		if offset[0] == '-':
+			offset_seconds = -offset_seconds
+	# datetime checks the fields are a real date and time
+	datetime.datetime(*fields)
+	return calendar.timegm(fields) - offset_seconds, fixed_zone(offset_seconds)
+
+def parse_clock(text):
+	"""
+	(hour, minute) for a time of day in one of the forms
+	interpret_time accepts, or None if it isn't one of them.
+	"""
+	match = CLOCK.match(text or '')
+	if match is None:
+		return None
+	hour, minute, half = match.groups()
+	if minute is None and half is None:
+		return None
+	hour = int(hour)
+	minute = int(minute or 0)
+	if half is not None:
+		if not 1 <= hour <= 12:
+			return None
+		hour = hour % 12 + (12 if half.lower() == 'pm' else 0)
+	if hour > 23 or minute > 59:
+		return None
+	return hour, minute
+
+def parse_us_datetime(text):
+	"""
+	(year, month, day, hour, minute) for 'MM/DD/YYYY <time of day>',
+	or None if text isn't in that form.
+	"""
+	match = US_DATE.match(text or '')
+	if match is None:
+		return None
+	clock = parse_clock(match.group(4))
+	if clock is None:
+		return None
+	return (int(match.group(3)), int(match.group(1)), int(match.group(2))) + clock
+
+def as_datetime(value):
+	"""
+	datetime for an arrow object, datetime, or ISO text.
+	"""
+	if isinstance(value, datetime.datetime):
+		return value
+	if isinstance(value, arrow.Arrow):
+		return value.datetime
+	seconds, tzinfo = parse_timestamp(value)
+	return datetime.datetime.fromtimestamp(seconds, tzinfo)
+
+def iso_timestamp(seconds, tzinfo):
+	"""
+	ISO text for epoch seconds shown in tzinfo.
+	"""
+	return datetime.datetime.fromtimestamp(seconds, tzinfo).isoformat()
+
+def display_timestamp(seconds, tzinfo):
+	"""
+	Epoch seconds in tzinfo the way fmtdateTime shows them.
+	"""
+	return datetime.datetime.fromtimestamp(seconds, tzinfo).strftime("%m/%d/%Y %H:%M")
+
+#################
+#
+# Functions used within the templates
+#
+#################
+
+def register_filters(app):
+	"""
+	Make the filters below available to app's templates.
+	"""
+	app.add_template_filter(format_arrow_date, 'fmtdate')
+	app.add_template_filter(format_arrow_time, 'fmttime')
+	app.add_template_filter(format_arrow_dateTime, 'fmtdateTime')
+
+def format_arrow_date( date ):
+	try:
+		normal = as_datetime( date )
+		return normal.strftime("%a %m/%d/%Y")
+	except:
+		return "(bad date)"
+
+def format_arrow_time( time ):
+	try:
+		normal = as_datetime( time )
+		return normal.strftime("%H:%M")
+	except:
+		return "(bad time)"
+
+def format_arrow_dateTime( dateTime ):
+	try:
+		normal = as_datetime(dateTime)
+		return normal.strftime("%m/%d/%Y %H:%M")
+	except:
+		return "(bad dateTime)"
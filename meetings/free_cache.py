@@ -0,0 +1,71 @@
+import hashlib
+import logging
+
+from free_times import iter_free_daily, merge_intervals, window_filter
+from lru_cache import LRUCache
+
+def fingerprint(user_key, cal_id, events):
+	"""
+	Key for one user's view of one calendar: the user, the calendar's
+	ID and what identifies the events.  For a Timeline (which
+	EventStore.events reuses until a sync brings changes) that is its
+	serial number, so a cache hit reads none of the events.  Other
+	lists of Intervals (see intervals.Event) are digested: each
+	event's ID, etag, updated stamp and times.
+	"""
+	serial = getattr(events, 'serial', None)
+	if serial is not None:
+		return (user_key, cal_id, 'timeline', serial)
+	digest = hashlib.sha1()
+	for event in events:
+		digest.update("{}\0{}\0{}\0{}\0{}\n".format(event.id, event.etag,
+			getattr(event, 'updated', None), event.start, event.end).encode('utf-8'))
+	return (user_key, cal_id, len(events), digest.hexdigest())
+
+class FreeTimeCache:
+	"""
+	Memoizes time_order and free-time results.  Each calendar's busy
+	events (filtered to the range) and merged busy intervals are kept
+	on their own, keyed by the calendar's fingerprint and the range,
+	so changing one selected calendar only recomputes that calendar.
+	Free times are kept per combination of calendars.  Both caches
+	are LRU, capped by the number of events and intervals they hold.
+	"""
+	def __init__(self, maxsize=1024, max_items=200000):
+		self.calendars = LRUCache(maxsize=maxsize, maxweight=max_items)
+		self.results = LRUCache(maxsize=maxsize, maxweight=max_items)
+
+	def busy(self, user_key, cal_id, events, bounds):
+		"""
+		(key, busy, merged) for user_key's view of one calendar (see
+		flask_main.credentials_key): its events that fall in
+		bounds (see flask_main.session_bounds), as time_order gives
+		them, and their union as disjoint Intervals.  key identifies
+		this contribution for free().
+		"""
+		key = (fingerprint(user_key, cal_id, events), tuple(bounds))
+		cached = self.calendars.get(key)
+		if cached is None:
+			busy = list(window_filter(events, *bounds))
+			merged = list(merge_intervals(sorted(busy)))
+			cached = (busy, merged)
+			self.calendars.put(key, cached, weight=len(busy) + len(merged) + 1)
+		return (key,) + cached
+
+	def free(self, contributions, bounds, tzinfo):
+		"""
+		Free Intervals shared by the calendars whose busy() results
+		are given, inside each day's window of bounds in tzinfo.
+		"""
+		# dateutil zones aren't hashable; their repr names them
+		key = (tuple(sorted(contribution[0] for contribution in contributions)),
+			tuple(bounds), repr(tzinfo))
+		free = self.results.get(key)
+		if free is None:
+			free = list(iter_free_daily([contribution[2] for contribution in contributions],
+				*bounds, tzinfo=tzinfo))
+			self.results.put(key, free, weight=len(free) + 1)
+		return free
+
+	def stats(self):
+		return {'calendars': self.calendars.stats(), 'results': self.results.stats()}
@@ -1,10 +1,278 @@
 import arrow
+import bisect
+import datetime
+import heapq
+import itertools
 import logging
 import re
 
-def calculate_free(ordered_events, start_time, end_time):
+from formatting import epoch, parse_timestamp
+from intervals import Interval
+
+# Largest UTC offset in use (UTC+14), in seconds
+MAX_OFFSET = 14 * 3600
+# Free-time engines calculate_free and calculate_free_merged can use
+BACKENDS = ('interval', 'grid')
+
+def calculate_free(ordered_events, start_time, end_time, backend='interval', slot=900):
+	"""
+	Calculate free times based on busy times.
+
+	Events are converted to integer epoch intervals once, sorted,
+	and swept in a single pass, so the cost is O(n log n) in the
+	number of events.  Returns a list of [iso_start, iso_end] pairs.
+	backend='grid' uses the NumPy slot grid instead, with slots of
+	slot seconds (see slot_grid).
+	"""
+	check_backend(backend)
+	if backend == 'grid':
+		from slot_grid import calculate_free_grid
+		return calculate_free_grid([ordered_events], start_time, end_time, slot)
+	intervals = sorted(event_intervals(ordered_events))
+	span = Interval.parse(start_time, end_time)
+	return [gap.isoformat() for gap in sweep_free(intervals, span)]
+
+def calculate_free_merged(event_lists, start_time, end_time, backend='interval', slot=900):
+	"""
+	Calculate free times common to several calendars.
+
+	event_lists holds one list of busy events per calendar.  Each list
+	is sorted on its own (already-sorted lists cost linear time), then
+	the lists are combined with a k-way merge and swept once, so the
+	work grows with the total number of events rather than with the
+	number of calendars.  backend and slot are as for calculate_free.
+	"""
+	check_backend(backend)
+	if backend == 'grid':
+		from slot_grid import calculate_free_grid
+		return calculate_free_grid(event_lists, start_time, end_time, slot)
+	merged = heapq.merge(*[sorted(event_intervals(events)) for events in event_lists])
+	span = Interval.parse(start_time, end_time)
+	return [gap.isoformat() for gap in sweep_free(merged, span)]
+
+def check_backend(backend):
+	"""
+	Raise ValueError unless backend is one of BACKENDS.
+	"""
+	if backend not in BACKENDS:
+		raise ValueError("backend must be one of {}, not {!r}".format(
+			", ".join(BACKENDS), backend))
+
+def earliest_free(ordered_events, start_time, end_time, min_duration=0, limit=None):
+	"""
+	Yield the earliest free times lasting at least min_duration
+	seconds, as [iso_start, iso_end] pairs, stopping after limit of
+	them (never, if limit is None).
+
+	ordered_events must already be sorted by start, as EventStore.events
+	returns them.  They are parsed and swept lazily, so events after
+	the last slot found are never looked at.
+	"""
+	if limit is not None and limit <= 0:
+		return
+	found = 0
+	span = Interval.parse(start_time, end_time)
+	for gap in sweep_free(event_intervals(ordered_events), span):
+		if gap.duration() < min_duration:
+			continue
+		yield gap.isoformat()
+		found += 1
+		if found == limit:
+			return
+
+def calculate_free_daily(event_lists, first_day, last_day, day_start, day_end, tzinfo):
+	"""
+	Calculate free times common to several calendars, within the
+	daily window day_start..day_end (seconds of the day, wall-clock
+	time in tzinfo) of each day first_day..last_day (day numbers).
+	Nights between the windows are never free.  Returns a list of
+	Intervals.
+
+	Events are merged across calendars and swept against the windows
+	in one pass, so only events inside working hours cost more than
+	a comparison.
+	"""
+	return list(iter_free_daily(event_lists, first_day, last_day, day_start, day_end, tzinfo))
+
+def iter_free_daily(event_lists, first_day, last_day, day_start, day_end, tzinfo):
+	"""
+	Yield the Intervals calculate_free_daily returns as the sweep
+	finds them.
+	"""
+	merged = heapq.merge(*[sorted(event_intervals(events)) for events in event_lists])
+	windows = daily_windows(first_day, last_day, day_start, day_end, tzinfo)
+	return sweep_windows(merged, windows)
+
+def daily_windows(first_day, last_day, day_start, day_end, tzinfo):
+	"""
+	Lazily yield each day's window as an Interval in tzinfo.
+	Windows are built from wall-clock times, so they follow daylight
+	saving changes.  A window whose end is not after its start runs
+	into the next day.
+	"""
+	for day in range(first_day, last_day + 1):
+		date = datetime.date(1970, 1, 1) + datetime.timedelta(days=day)
+		start = wall_clock(date, day_start, tzinfo)
+		if day_end > day_start:
+			end = wall_clock(date, day_end, tzinfo)
+		else:
+			end = wall_clock(date + datetime.timedelta(days=1), day_end, tzinfo)
+		yield Interval(epoch(start), epoch(end), tzinfo)
+
+def wall_clock(date, seconds, tzinfo):
+	"""
+	Arrow object for seconds past midnight on date, in tzinfo.
+	"""
+	return arrow.Arrow(date.year, date.month, date.day,
+		seconds // 3600, seconds % 3600 // 60, seconds % 60, tzinfo=tzinfo)
+
+def merge_intervals(intervals):
+	"""
+	Yield the union of Intervals sorted by start, as disjoint
+	Intervals.
+	"""
+	current = None
+	for interval in intervals:
+		if current is None:
+			current = interval
+		elif interval.start <= current.end:
+			if interval.end > current.end:
+				current = Interval(current.start, interval.end, current.tzinfo)
+		else:
+			yield current
+			current = interval
+	if current is not None:
+		yield current
+
+def sweep_windows(intervals, windows):
+	"""
+	Yield the free gaps, as sweep_free does, inside each of the
+	windows (sorted, disjoint Intervals) left by busy Intervals
+	sorted by start.  Both are walked once.
+	"""
+	busy = merge_intervals(intervals)
+	current = next(busy, None)
+	for window in windows:
+		cursor = window.start
+		zone = window.tzinfo
+		while current is not None and current.end <= window.start:
+			current = next(busy, None)
+		while current is not None and current.start < window.end:
+			if current.start > cursor:
+				yield Interval(cursor, current.start, zone)
+			if current.end >= window.end:
+				# busy to the end of the window; may cover the next one too
+				cursor = None
+				break
+			cursor = current.end
+			zone = current.tzinfo
+			current = next(busy, None)
+		if cursor is not None and cursor < window.end:
+			yield Interval(cursor, window.end, zone)
+
+def event_intervals(events):
+	"""
+	Intervals of busy events.  Events that are already Intervals
+	(see intervals.Event) pass straight through; dicts with 'start'
+	and 'end' are parsed exactly once.
+	"""
+	for event in events:
+		if isinstance(event, Interval):
+			yield event
+		else:
+			yield Interval.parse(event['start'], event['end'])
+
+def sweep_free(intervals, span):
+	"""
+	Yield the free gaps left in the Interval span by busy Intervals,
+	which must be sorted by start.  Each gap is shown in the timezone
+	of whatever it starts from: the span, or the busy interval
+	before it.
+	"""
+	cursor = span.start
+	zone = span.tzinfo
+	for interval in intervals:
+		if interval.start >= span.end:
+			break
+		if interval.end <= cursor:
+			continue
+		if interval.start > cursor:
+			yield Interval(cursor, interval.start, zone)
+		cursor = interval.end
+		zone = interval.tzinfo
+		if cursor >= span.end:
+			return
+	if cursor < span.end:
+		yield Interval(cursor, span.end, zone)
+
+def wall_seconds(text):
+	"""
+	Wall-clock time of an ISO string as seconds since 1970-01-01,
+	ignoring its UTC offset (so 10:00-08:00 and 10:00+00:00 give
+	the same number).  Day number is wall_seconds // 86400 and time
+	of day wall_seconds % 86400.
+	"""
+	seconds, tzinfo = parse_timestamp(text)
+	# zones with DST rules only give an offset for a given moment
+	offset = datetime.datetime.fromtimestamp(seconds, tzinfo).utcoffset()
+	return seconds + int(offset.total_seconds())
+
+def wall_span(event):
+	"""
+	Wall-clock (start, end) seconds of an event, as wall_seconds
+	gives them.  Intervals need no parsing.
+	"""
+	if isinstance(event, Interval):
+		return event.wall(event.start), event.wall(event.end)
+	return wall_seconds(event['start']), wall_seconds(event['end'])
+
+def window_filter(events, first_day, last_day, day_start, day_end):
+	"""
+	Yield the events that fall within days first_day..last_day
+	(day numbers) and overlap the daily window day_start..day_end
+	(seconds of the day), all in wall-clock time.
+
+	For a Timeline (as EventStore.events gives), its epoch starts
+	are bisected, widened by the largest UTC offset since the days
+	are in wall-clock time, and only the events from there to past
+	last_day are looked at.  Other events are each parsed once and
+	sorted by wall-clock start first.
+	"""
+	starts = getattr(events, 'starts', None)
+	if starts is not None:
+		first = bisect.bisect_left(starts, first_day * 86400 - MAX_OFFSET)
+		stop = (last_day + 1) * 86400 + MAX_OFFSET
+		candidates = (wall_span(event) + (event,)
+			for event in itertools.takewhile(lambda event: event.start < stop,
+				itertools.islice(events, first, None)))
+	else:
+		timed = sorted((wall_span(event) + (event,) for event in events),
+			key=lambda entry: entry[0])
+		first = bisect.bisect_left([entry[0] for entry in timed], first_day * 86400)
+		candidates = itertools.takewhile(lambda entry: entry[0] // 86400 <= last_day,
+			itertools.islice(timed, first, None))
+	for e_start, e_end, event in candidates:
+		if e_start < first_day * 86400 or e_end // 86400 > last_day:
+			continue
+		s_time = e_start % 86400
+		e_time = e_end % 86400
+		before_lap = s_time < day_start and e_time > day_start
+		after_lap = e_time > day_end and s_time < day_end
+		during = e_time <= day_end and s_time >= day_start
+		if before_lap or after_lap or during:
+			yield event
+
+def calculate_free_reference(ordered_events, start_time, end_time):
 	"""
 	Calculate free times based on busy times.
+
+	The original calculate_free, unchanged, kept to cross-check the
+	sweep: it splits every free block against every event,
+	O(events x blocks).  It drops a free block that an event does
+	not overlap or starts or ends exactly with, and turns one an
+	event covers entirely into a backwards block, so it only agrees
+	with calculate_free for events that partly overlap every
+	remaining block.
 	"""
 	# start with full block
 	start = arrow.get(start_time)
@@ -43,13 +311,3 @@ def calculate_free(ordered_events, start_time, end_time):
 		free_times = new_free_times
 
 	return free_times
-
-
-
-
-
-
-
-
-
-
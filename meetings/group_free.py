@@ -0,0 +1,88 @@
+import logging
+
+from free_times import event_intervals
+from intervals import Interval
+
+def find_group_free(participants, start_time, end_time, quorum=None):
+	"""
+	Calculate free times for a group.
+
+	participants holds one list of busy events per attendee.  Returns
+	a list of [iso_start, iso_end] pairs, in the timezone of start_time,
+	during which at least quorum attendees are free (all of them if
+	quorum is None).
+	"""
+	span = Interval.parse(start_time, end_time)
+	busy_lists = []
+	for events in participants:
+		busy_lists.append([(interval.start, interval.end) for interval in event_intervals(events)])
+	free_times = []
+	for free_start, free_end in group_free(busy_lists, span.start, span.end, quorum):
+		free_times.append(Interval(free_start, free_end, span.tzinfo).isoformat())
+	return free_times
+
+def group_free(busy_lists, range_start, range_end, quorum=None):
+	"""
+	Free (start, end) epoch pairs within [range_start, range_end)
+	where at least quorum of the len(busy_lists) attendees are free.
+
+	Each attendee's busy (start, end) epoch pairs are merged first so
+	overlapping events of one person count once.  Then every busy
+	interval becomes a +1/-1 boundary in a single flat list, which is
+	sorted and swept with a running count of busy attendees, so the
+	cost is O(E log E) in the total number of events E regardless of
+	the number of attendees.  With no attendees (and no quorum) the
+	whole range is free.
+	"""
+	attendees = len(busy_lists)
+	if not attendees:
+		if quorum is not None:
+			raise ValueError("quorum given, but there are no attendees")
+		return [(range_start, range_end)] if range_start < range_end else []
+	if quorum is None:
+		quorum = attendees
+	if not 0 < quorum <= attendees:
+		raise ValueError("quorum must be between 1 and {}".format(attendees))
+	allowed_busy = attendees - quorum
+
+	boundaries = []
+	for busy in busy_lists:
+		for b_start, b_end in merge_busy(busy, range_start, range_end):
+			boundaries.append((b_start, 1))
+			boundaries.append((b_end, -1))
+	# ends sort before starts at the same instant
+	boundaries.sort()
+
+	free_times = []
+	busy_count = 0
+	free_since = range_start
+	for moment, change in boundaries:
+		was_free = busy_count <= allowed_busy
+		busy_count += change
+		is_free = busy_count <= allowed_busy
+		if was_free and not is_free:
+			if moment > free_since:
+				free_times.append((free_since, moment))
+		elif is_free and not was_free:
+			free_since = moment
+	if busy_count <= allowed_busy and free_since < range_end:
+		free_times.append((free_since, range_end))
+	return free_times
+
+def merge_busy(busy, range_start, range_end):
+	"""
+	Sort one attendee's busy (start, end) pairs, clip them to the
+	range and merge the ones that overlap or touch.
+	"""
+	merged = []
+	for b_start, b_end in sorted(busy):
+		b_start = max(b_start, range_start)
+		b_end = min(b_end, range_end)
+		if b_start >= b_end:
+			continue
+		if merged and b_start <= merged[-1][1]:
+			if b_end > merged[-1][1]:
+				merged[-1] = (merged[-1][0], b_end)
+		else:
+			merged.append((b_start, b_end))
+	return merged
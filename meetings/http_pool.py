@@ -0,0 +1,174 @@
+"""
+Pooled HTTP transport for the Google API client.
+
+A fresh httplib2.Http per request means a fresh TCP and TLS
+handshake with Google every time.  ConnectionPool keeps keep-alive
+connections per host, shared by all threads and requests, and asks
+for gzip-compressed responses.  PooledHttp is the httplib2.Http
+look-alike the API client and oauth2client expect; it is cheap, so
+each set of credentials authorizes its own PooledHttp (authorize
+patches the object it is given) while they all share one pool:
+
+    POOL = ConnectionPool()
+    http = credentials.authorize(PooledHttp(POOL))
+    service = discovery.build_from_document(document, http=http)
+"""
+import gzip
+import http.client
+import logging
+import os
+import ssl
+import threading
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+REDIRECTS = (301, 302, 303, 307, 308)
+# Methods safe to send again when a kept-alive connection turns out
+# to be closed; a POST (such as a token refresh) is never resent
+IDEMPOTENT = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+class Response(dict):
+	"""
+	Response headers (lower-case names) with status and reason
+	attributes, shaped like httplib2.Response.  A header sent more
+	than once has its values joined with ', ', as httplib2 does.
+	"""
+	def __init__(self, response):
+		super().__init__()
+		for name, value in response.getheaders():
+			name = name.lower()
+			self[name] = self[name] + ', ' + value if name in self else value
+		self.status = response.status
+		self.reason = response.reason
+		self['status'] = str(response.status)
+
+class ConnectionPool:
+	"""
+	Thread-safe pool of keep-alive connections, at most maxsize idle
+	ones per (scheme, host).  Counts connections created and reused.
+	Connections are never shared across a fork: a process that
+	finds the pool was filled by its parent (gunicorn --preload)
+	drops them and opens its own.
+	"""
+	def __init__(self, maxsize=16, timeout=30, ssl_context=None):
+		self.maxsize = maxsize
+		self.timeout = timeout
+		self.ssl_context = ssl_context or ssl.create_default_context()
+		self.created = 0
+		self.reused = 0
+		self._idle = {}
+		self._pid = os.getpid()
+		self._lock = threading.Lock()
+
+	def _connection(self, scheme, netloc, timeout):
+		"""
+		(connection, reused) for scheme://netloc.
+		"""
+		with self._lock:
+			if self._pid != os.getpid():
+				# the parent's sockets and TLS state: leave them alone
+				self._idle = {}
+				self._pid = os.getpid()
+			idle = self._idle.get((scheme, netloc))
+			if idle:
+				self.reused += 1
+				connection = idle.pop()
+				connection.timeout = timeout
+				if connection.sock is not None:
+					connection.sock.settimeout(timeout)
+				return connection, True
+			self.created += 1
+		if scheme == 'https':
+			return http.client.HTTPSConnection(netloc, timeout=timeout,
+				context=self.ssl_context), False
+		return http.client.HTTPConnection(netloc, timeout=timeout), False
+
+	def _release(self, scheme, netloc, connection):
+		with self._lock:
+			if self._pid != os.getpid():
+				connection.close()
+				return
+			idle = self._idle.setdefault((scheme, netloc), [])
+			if len(idle) < self.maxsize:
+				idle.append(connection)
+				return
+		connection.close()
+
+	def request(self, uri, method='GET', body=None, headers=None, timeout=None):
+		"""
+		(Response, content) for one request.  gzip-encoded content
+		is decoded; the original encoding is kept as
+		'-content-encoding', as httplib2 does.  timeout (seconds)
+		defaults to the pool's.
+		"""
+		if timeout is None:
+			timeout = self.timeout
+		parts = urllib.parse.urlsplit(uri)
+		path = parts.path or '/'
+		if parts.query:
+			path += '?' + parts.query
+		headers = {name.lower(): value for name, value in (headers or {}).items()}
+		headers.setdefault('accept-encoding', 'gzip')
+		# Google only compresses for user agents that mention gzip
+		if 'gzip' not in headers.get('user-agent', ''):
+			headers['user-agent'] = (headers.get('user-agent', '') + ' (gzip)').strip()
+		while True:
+			connection, reused = self._connection(parts.scheme, parts.netloc, timeout)
+			try:
+				connection.request(method, path, body, headers)
+				response = connection.getresponse()
+				content = response.read()
+			except (http.client.HTTPException, OSError):
+				connection.close()
+				if reused and method.upper() in IDEMPOTENT:
+					# the server closed an idle connection: try another
+					continue
+				raise
+			break
+		if response.will_close:
+			connection.close()
+		else:
+			self._release(parts.scheme, parts.netloc, connection)
+		result = Response(response)
+		if result.get('content-encoding') == 'gzip':
+			content = gzip.decompress(content)
+			result['-content-encoding'] = result.pop('content-encoding')
+			result['content-length'] = str(len(content))
+		return result, content
+
+	def clear(self):
+		"""
+		Close the idle connections.
+		"""
+		with self._lock:
+			idle, self._idle = self._idle, {}
+		for connections in idle.values():
+			for connection in connections:
+				connection.close()
+
+	def stats(self):
+		with self._lock:
+			return {'created': self.created, 'reused': self.reused,
+				'idle': sum(len(connections) for connections in self._idle.values())}
+
+class PooledHttp:
+	"""
+	Stands in for httplib2.Http on top of a shared ConnectionPool.
+	timeout (seconds) applies to each request; None means the
+	pool's.
+	"""
+	def __init__(self, pool, timeout=None):
+		self.pool = pool
+		self.timeout = timeout
+
+	def request(self, uri, method='GET', body=None, headers=None,
+			redirections=5, connection_type=None):
+		response, content = self.pool.request(uri, method, body, headers, self.timeout)
+		while response.status in REDIRECTS and 'location' in response and redirections > 0:
+			if response.status == 303:
+				method, body = 'GET', None
+			uri = urllib.parse.urljoin(uri, response['location'])
+			redirections -= 1
+			response, content = self.pool.request(uri, method, body, headers, self.timeout)
+		return response, content
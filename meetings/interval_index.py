@@ -0,0 +1,140 @@
+"""
+Busy time of one calendar, kept up to date one event at a time.
+
+calculate_free and friends start from the whole event list.  A
+long-running service that hears about changes one event at a time
+(push notifications, sync-token deltas) can instead keep an
+IntervalIndex per calendar: adding or removing an event only
+touches the merged busy blocks it overlaps, and free gaps in any
+range are read off the blocks by binary search.
+"""
+import bisect
+import logging
+
+from dateutil import tz
+
+from calendar_fetch import event_record
+from free_times import merge_intervals, sweep_windows
+from intervals import Event, Interval
+
+class IntervalIndex:
+	"""
+	Events by key, as (start, end) epoch seconds, and their union
+	as disjoint busy blocks, both in sorted arrays.  Lookups are
+	binary searches; adding an event merges the blocks it overlaps,
+	and removing one re-merges only the events of its block.
+	Intervals handed out are shown in tzinfo.
+	"""
+	def __init__(self, tzinfo=None):
+		self.tzinfo = tzinfo if tzinfo is not None else tz.tzutc()
+		self._spans = {}
+		# (start, end, key), sorted
+		self._events = []
+		# merged busy blocks: starts and ends are both increasing
+		self._starts = []
+		self._ends = []
+
+	def __len__(self):
+		return len(self._spans)
+
+	def __contains__(self, key):
+		return key in self._spans
+
+	def add(self, key, start, end):
+		"""
+		Add (or move) the event key, busy from start to end.
+		"""
+		if key in self._spans:
+			if self._spans[key] == (start, end):
+				return
+			self.discard(key)
+		self._spans[key] = (start, end)
+		bisect.insort(self._events, (start, end, key))
+		# blocks touching [start, end] become one
+		first = bisect.bisect_left(self._ends, start)
+		last = bisect.bisect_right(self._starts, end)
+		if first < last:
+			start = min(start, self._starts[first])
+			end = max(end, self._ends[last - 1])
+		self._starts[first:last] = [start]
+		self._ends[first:last] = [end]
+
+	def discard(self, key):
+		"""
+		Remove the event key, if it is there.
+
+		Any event of its block may have been holding the block
+		together, so all of the block's events are re-merged: the
+		cost grows with the size of the block, not of the calendar.
+		A long event (a week-long trip, say) that overlaps many
+		others makes their block, and every discard in it, that
+		much dearer.
+		"""
+		span = self._spans.pop(key, None)
+		if span is None:
+			return
+		start, end = span
+		del self._events[bisect.bisect_left(self._events, (start, end, key))]
+		block = bisect.bisect_right(self._starts, start) - 1
+		block_start = self._starts[block]
+		block_end = self._ends[block]
+		first = bisect.bisect_left(self._events, (block_start,))
+		last = bisect.bisect_right(self._events, (block_end, float('inf')))
+		remaining = list(merge_intervals(Interval(event[0], event[1], None)
+			for event in self._events[first:last]))
+		self._starts[block:block + 1] = [interval.start for interval in remaining]
+		self._ends[block:block + 1] = [interval.end for interval in remaining]
+
+	def add_event(self, event):
+		"""
+		Add an Event (see intervals.py), keyed by its id.
+		"""
+		self.add(event.id, event.start, event.end)
+
+	def apply(self, items):
+		"""
+		Apply Calendar API event resources, such as a sync-token
+		delta: cancelled events are removed, the others added or
+		moved.
+		"""
+		for item in items:
+			if item.get("status") == "cancelled" or "start" not in item:
+				self.discard(item["id"])
+			else:
+				self.add_event(Event.from_record(event_record(item)))
+
+	def busy(self, start, end):
+		"""
+		Yield the busy blocks overlapping start to end (epoch
+		seconds), as Intervals.
+		"""
+		first = bisect.bisect_right(self._ends, start)
+		last = bisect.bisect_left(self._starts, end)
+		for block in range(first, last):
+			yield Interval(self._starts[block], self._ends[block], self.tzinfo)
+
+	def is_free(self, start, end):
+		"""
+		True if no event overlaps start to end.
+		"""
+		return next(self.busy(start, end), None) is None
+
+	def free(self, start, end):
+		"""
+		Free gaps between start and end (epoch seconds), as a list
+		of Intervals.
+		"""
+		return self.free_windows([Interval(start, end, self.tzinfo)])
+
+	def free_windows(self, windows):
+		"""
+		Free gaps inside each of windows (sorted, disjoint
+		Intervals, such as daily_windows gives), as a list of
+		Intervals.  Only the blocks between the first and last
+		window are read.
+		"""
+		windows = list(windows)
+		if not windows:
+			return []
+		busy = self.busy(windows[0].start, windows[-1].end)
+		return list(sweep_windows(busy, windows))
@@ -0,0 +1,129 @@
+import arrow
+import datetime
+import itertools
+
+from formatting import display_timestamp, iso_timestamp, parse_timestamp
+
+class Interval:
+	"""
+	A span of time as integer epoch seconds, with the timezone it
+	is shown in.  ISO text and arrow objects are only built when
+	asked for.
+	"""
+	__slots__ = ('start', 'end', 'tzinfo')
+
+	def __init__(self, start, end, tzinfo):
+		self.start = start
+		self.end = end
+		self.tzinfo = tzinfo
+
+	@classmethod
+	def parse(cls, start, end):
+		"""
+		Interval from two ISO strings (or anything arrow.get takes),
+		shown in the timezone of start.
+		"""
+		start, tzinfo = parse_timestamp(start)
+		return cls(start, parse_timestamp(end)[0], tzinfo)
+
+	def start_time(self):
+		return arrow.get(self.start).to(self.tzinfo)
+
+	def end_time(self):
+		return arrow.get(self.end).to(self.tzinfo)
+
+	def isoformat(self):
+		"""
+		[iso_start, iso_end], the form calculate_free returns.
+		"""
+		return [iso_timestamp(self.start, self.tzinfo), iso_timestamp(self.end, self.tzinfo)]
+
+	def start_display(self):
+		"""
+		Start as the templates show it, MM/DD/YYYY HH:mm.
+		"""
+		return display_timestamp(self.start, self.tzinfo)
+
+	def end_display(self):
+		return display_timestamp(self.end, self.tzinfo)
+
+	def wall(self, seconds):
+		"""
+		Epoch seconds shifted to wall-clock time in this interval's
+		timezone (see free_times.wall_seconds).
+		"""
+		offset = datetime.datetime.fromtimestamp(seconds, self.tzinfo).utcoffset()
+		return seconds + int(offset.total_seconds())
+
+	def duration(self):
+		return self.end - self.start
+
+	def __lt__(self, other):
+		return (self.start, self.end) < (other.start, other.end)
+
+	def _identity(self):
+		"""
+		What equality and hashing compare: the type and the times.
+		"""
+		return (type(self), self.start, self.end)
+
+	def __eq__(self, other):
+		return isinstance(other, Interval) and self._identity() == other._identity()
+
+	def __hash__(self):
+		return hash(self._identity())
+
+	def __repr__(self):
+		return "{}({!r}, {!r})".format(type(self).__name__, *self.isoformat())
+
+class Event(Interval):
+	"""
+	A busy event: an Interval plus the fields shown for it.  Also
+	readable like the dicts list_events used to return, so
+	event['start'] gives the ISO text.
+	"""
+	__slots__ = ('id', 'etag', 'updated', 'kind', 'summary', 'description')
+
+	@classmethod
+	def from_record(cls, record):
+		"""
+		Event from a dict shaped like calendar_fetch.event_record.
+		"""
+		span = Interval.parse(record['start'], record['end'])
+		event = cls(span.start, span.end, span.tzinfo)
+		event.id = record.get('id')
+		event.etag = record.get('etag')
+		event.updated = record.get('updated')
+		event.kind = record.get('kind')
+		event.summary = record.get('summary', "(no summary)")
+		event.description = record.get('description', "(no description)")
+		return event
+
+	def _identity(self):
+		# two events at the same time are still two events
+		return super()._identity() + (getattr(self, 'id', None),)
+
+	def __getitem__(self, key):
+		if key == 'start':
+			return iso_timestamp(self.start, self.tzinfo)
+		if key == 'end':
+			return iso_timestamp(self.end, self.tzinfo)
+		try:
+			return getattr(self, key)
+		except AttributeError:
+			raise KeyError(key)
+
+class Timeline(list):
+	"""
+	Intervals sorted by start, with their epoch starts alongside in
+	starts, so a range can be found by binary search without
+	reading (or parsing) the events outside it.  Timelines aren't
+	changed once built; each has its own serial number, so caches
+	can key on it instead of on the events.
+	"""
+	_serials = itertools.count()
+
+	def __init__(self, intervals=()):
+		super().__init__(sorted(intervals))
+		self.starts = [interval.start for interval in self]
+		self.serial = next(Timeline._serials)
@@ -0,0 +1,367 @@
+"""
+Load tests for /choose and /display, without Google.
+
+FakeCalendarServer stands in for the Google Calendar API.  It serves
+a discovery document for the two methods flask_main uses,
+calendarList.list and events.list, along with the calendar list and
+synthetic events (see benchmark.synthetic_items).  Responses are
+paged, carry sync tokens, and come after a configurable latency.
+run_load drives the app with concurrent simulated users, each with
+its own session, and summarize reports p50/p99 latency and requests
+per second:
+
+    python3 loadtest.py --users 20 --requests 50 --calendars 3 --events 500 --latency 0.05
+
+The app runs in this process on a threaded WSGI server, pointed at
+the stand-in through flask_main.DISCOVERY_URL.  With --url the app
+is one already running (under gunicorn, say): give it DISCOVERY_URL
+http://127.0.0.1:<--fake-port>/discovery/v1/apis/calendar/v3/rest
+and the same configuration as this process (SECRET_KEY, and
+SESSION_STORE if set), since the simulated users' sessions are
+seeded through the app's session interface.
+"""
+import argparse
+import collections
+import datetime
+import gzip
+import http.server
+import json
+import logging
+import math
+import sys
+import threading
+import time
+import urllib.parse
+
+import flask
+
+from benchmark import RANGE_START, synthetic_items
+from formatting import as_datetime, parse_timestamp
+from http_pool import ConnectionPool
+
+DISCOVERY_PATH = '/discovery/v1/apis/calendar/v3/rest'
+SCOPE = 'https://www.googleapis.com/auth/calendar.readonly'
+
+def discovery_document(root_url):
+	"""
+	Calendar v3 discovery document with just calendarList.list and
+	events.list, served from root_url.
+	"""
+	def query(kind, **extra):
+		return dict(type=kind, location='query', **extra)
+	return {
+		'kind': 'discovery#restDescription', 'discoveryVersion': 'v1',
+		'id': 'calendar:v3', 'name': 'calendar', 'version': 'v3',
+		'rootUrl': root_url, 'servicePath': 'calendar/v3/',
+		'baseUrl': root_url + 'calendar/v3/', 'basePath': '/calendar/v3/',
+		'batchPath': 'batch/calendar/v3',
+		'parameters': {name: query('string') for name in
+			['alt', 'fields', 'key', 'oauth_token', 'quotaUser', 'userIp']},
+		'schemas': {},
+		'resources': {
+			'calendarList': {'methods': {'list': {
+				'id': 'calendar.calendarList.list', 'httpMethod': 'GET',
+				'path': 'users/me/calendarList',
+				'parameters': {'maxResults': query('integer'), 'pageToken': query('string'),
+					'showDeleted': query('boolean'), 'syncToken': query('string')},
+				'scopes': [SCOPE]}}},
+			'events': {'methods': {'list': {
+				'id': 'calendar.events.list', 'httpMethod': 'GET',
+				'path': 'calendars/{calendarId}/events',
+				'parameters': {'calendarId': {'type': 'string', 'location': 'path', 'required': True},
+					'maxResults': query('integer'), 'orderBy': query('string'),
+					'pageToken': query('string'), 'showDeleted': query('boolean'),
+					'singleEvents': query('boolean'), 'syncToken': query('string'),
+					'timeMin': query('string'), 'timeMax': query('string')},
+				'parameterOrder': ['calendarId'],
+				'scopes': [SCOPE]}}}}}
+
+class FakeCalendarHandler(http.server.BaseHTTPRequestHandler):
+	"""
+	Hands requests to the FakeCalendarServer the HTTP server belongs to.
+	"""
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		self.answer()
+
+	def do_POST(self):
+		self.rfile.read(int(self.headers.get('Content-Length') or 0))
+		self.answer()
+
+	def answer(self):
+		parts = urllib.parse.urlsplit(self.path)
+		status, record = self.server.fake.respond(self.command, parts.path,
+			urllib.parse.parse_qs(parts.query))
+		body = json.dumps(record, separators=(',', ':')).encode('utf-8')
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json; charset=UTF-8')
+		if 'gzip' in self.headers.get('Accept-Encoding', ''):
+			body = gzip.compress(body)
+			self.send_header('Content-Encoding', 'gzip')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+class FakeCalendarServer:
+	"""
+	Local stand-in for the Calendar API: calendars calendars of events
+	synthetic events each over days days from start, pages of at most
+	page_size items, each API response after latency seconds.  Counts
+	requests by method in requests.
+	"""
+	def __init__(self, calendars=3, events=500, days=7, page_size=250, latency=0.0,
+			start=RANGE_START, seed=0, host='127.0.0.1', port=0):
+		self.page_size = page_size
+		self.latency = latency
+		self.requests = collections.Counter()
+		self._lock = threading.Lock()
+		self.calendars = [{'kind': 'calendar#calendarListEntry',
+			'id': 'calendar{}@example.com'.format(n), 'summary': 'Calendar {}'.format(n),
+			'selected': True, 'primary': n == 0} for n in range(calendars)]
+		self.events = {}
+		for n, calendar in enumerate(self.calendars):
+			items = synthetic_items(events, days, seed=seed + n, start=start)
+			self.events[calendar['id']] = [(moment(item['start']), moment(item['end']), item)
+				for item in items]
+		self.server = http.server.ThreadingHTTPServer((host, port), FakeCalendarHandler)
+		self.server.daemon_threads = True
+		self.server.fake = self
+		self.url = 'http://{}:{}'.format(host, self.server.server_address[1])
+
+	def start(self):
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+	def count(self, method):
+		with self._lock:
+			self.requests[method] += 1
+
+	def respond(self, method, path, query):
+		"""
+		(status, JSON record) for a request.
+		"""
+		def arg(name, default=None):
+			return query.get(name, [default])[0]
+		segments = path.strip('/').split('/')
+		if path == DISCOVERY_PATH:
+			self.count('discovery')
+			return 200, discovery_document(self.url + '/')
+		if path == '/token':
+			self.count('token')
+			return 200, {'access_token': 'refreshed', 'expires_in': 3600, 'token_type': 'Bearer'}
+		if segments[:2] != ['calendar', 'v3']:
+			return 404, error(404, "Not Found")
+		time.sleep(self.latency)
+		if segments[2:] == ['users', 'me', 'calendarList']:
+			self.count('calendarList.list')
+			return 200, self.page('calendar#calendarList', self.calendars,
+				arg('pageToken'), arg('maxResults'))
+		if len(segments) == 5 and segments[2] == 'calendars' and segments[4] == 'events':
+			self.count('events.list')
+			cal_id = urllib.parse.unquote(segments[3])
+			if cal_id not in self.events:
+				return 404, error(404, "Not Found")
+			if arg('syncToken') is not None:
+				# nothing ever changes here
+				return 200, {'kind': 'calendar#events', 'items': [], 'nextSyncToken': 'unchanged'}
+			low = moment({'dateTime': arg('timeMin')}) if arg('timeMin') else None
+			high = moment({'dateTime': arg('timeMax')}) if arg('timeMax') else None
+			items = [item for start, end, item in self.events[cal_id]
+				if (low is None or end > low) and (high is None or start < high)]
+			return 200, self.page('calendar#events', items, arg('pageToken'), arg('maxResults'))
+		return 404, error(404, "Not Found")
+
+	def page(self, kind, items, page_token, max_results):
+		"""
+		The page of items starting at page_token (an offset).
+		"""
+		size = min(self.page_size, int(max_results or self.page_size))
+		first = int(page_token or 0)
+		record = {'kind': kind, 'items': items[first:first + size]}
+		if first + size < len(items):
+			record['nextPageToken'] = str(first + size)
+		else:
+			record['nextSyncToken'] = 'unchanged'
+		return record
+
+def moment(time):
+	"""
+	Epoch seconds of an event resource's start or end.
+	"""
+	return parse_timestamp(time.get('dateTime') or time.get('date'))[0]
+
+def error(code, message):
+	return {'error': {'code': code, 'message': message, 'errors': [{'reason': message}]}}
+
+def credentials_json(access_token, token_uri):
+	"""
+	OAuth2Credentials JSON for a simulated user, good for a day.
+	"""
+	expiry = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+	return json.dumps({'_module': 'oauth2client.client', '_class': 'OAuth2Credentials',
+		'access_token': access_token, 'refresh_token': 'refresh-' + access_token,
+		'client_id': 'load-test', 'client_secret': 'load-test',
+		'token_expiry': expiry.strftime('%Y-%m-%dT%H:%M:%SZ'), 'token_uri': token_uri,
+		'user_agent': None, 'revoke_uri': None, 'id_token': None, 'token_response': None,
+		'scopes': [SCOPE], 'token_info_uri': None, 'invalid': False})
+
+def session_values(access_token, token_uri, start=RANGE_START, days=7):
+	"""
+	Session contents of a signed-in user who picked days days from
+	start, 9am to 5pm.
+	"""
+	begin = as_datetime(start)
+	end = begin + datetime.timedelta(days=days) - datetime.timedelta(seconds=1)
+	return {'credentials': credentials_json(access_token, token_uri),
+		'begin_date': begin.isoformat(), 'end_date': end.isoformat(),
+		'begin_time': datetime.datetime(2016, 1, 1, 9, tzinfo=begin.tzinfo).isoformat(),
+		'end_time': datetime.datetime(2016, 1, 1, 17, tzinfo=begin.tzinfo).isoformat(),
+		'daterange': "{} - {}".format(begin.strftime('%m/%d/%Y'), end.strftime('%m/%d/%Y'))}
+
+def session_cookie(app, values):
+	"""
+	'name=value' cookie for a new session of app holding values,
+	saved through app's session interface.
+	"""
+	with app.test_request_context('/'):
+		session = app.session_interface.open_session(app, flask.request)
+		session.update(values)
+		response = app.response_class()
+		app.session_interface.save_session(app, session, response)
+		return response.headers['Set-Cookie'].split(';')[0]
+
+def run_load(base_url, steps, cookies, requests=10):
+	"""
+	One thread per cookie (simulated user), all starting together,
+	each going through steps -- (name, method, path, form body or
+	None) -- requests times over its own keep-alive connection.
+	Returns the (name, seconds, ok) samples and the elapsed seconds.
+	"""
+	samples = []
+	lock = threading.Lock()
+	start = threading.Barrier(len(cookies) + 1)
+
+	def user(cookie):
+		pool = ConnectionPool(maxsize=1)
+		mine = []
+		start.wait()
+		for _ in range(requests):
+			for name, method, path, body in steps:
+				headers = {'cookie': cookie}
+				if body is not None:
+					headers['content-type'] = 'application/x-www-form-urlencoded'
+				begin = time.perf_counter()
+				try:
+					response, content = pool.request(base_url + path, method, body, headers)
+					ok = 200 <= response.status < 300
+				except Exception:
+					ok = False
+				mine.append((name, time.perf_counter() - begin, ok))
+		pool.clear()
+		with lock:
+			samples.extend(mine)
+
+	threads = [threading.Thread(target=user, args=(cookie,)) for cookie in cookies]
+	for thread in threads:
+		thread.start()
+	start.wait()
+	begin = time.perf_counter()
+	for thread in threads:
+		thread.join()
+	return samples, time.perf_counter() - begin
+
+def percentile(ordered, fraction):
+	"""
+	Nearest-rank percentile of a sorted, non-empty list.
+	"""
+	return ordered[max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))]
+
+def summarize(samples, elapsed):
+	"""
+	{step name (and 'all'): {'requests', 'errors', 'p50', 'p99',
+	'rps'}}, latencies in seconds.
+	"""
+	by_name = collections.defaultdict(list)
+	for name, seconds, ok in samples:
+		by_name[name].append((seconds, ok))
+		by_name['all'].append((seconds, ok))
+	summary = {}
+	for name, results in by_name.items():
+		latencies = sorted(seconds for seconds, ok in results)
+		summary[name] = {'requests': len(results),
+			'errors': sum(1 for seconds, ok in results if not ok),
+			'p50': percentile(latencies, 0.50), 'p99': percentile(latencies, 0.99),
+			'rps': len(results) / elapsed if elapsed else 0.0}
+	return summary
+
+def report(summary, output=sys.stdout):
+	output.write("{:10} {:>9} {:>7} {:>10} {:>10} {:>9}\n".format(
+		"step", "requests", "errors", "p50 ms", "p99 ms", "req/s"))
+	for name in sorted(summary, key=lambda name: (name == 'all', name)):
+		row = summary[name]
+		output.write("{:10} {:9d} {:7d} {:10.1f} {:10.1f} {:9.1f}\n".format(name,
+			row['requests'], row['errors'], 1000 * row['p50'], 1000 * row['p99'], row['rps']))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Load-test /choose and /display against a fake Google Calendar")
+	parser.add_argument('--users', type=int, default=10, help="concurrent simulated users")
+	parser.add_argument('--requests', type=int, default=20, help="/choose + /display rounds per user")
+	parser.add_argument('--calendars', type=int, default=3, help="calendars per user")
+	parser.add_argument('--events', type=int, default=500, help="events per calendar")
+	parser.add_argument('--days', type=int, default=7, help="days the events and range span")
+	parser.add_argument('--page-size', type=int, default=250, help="items per API page")
+	parser.add_argument('--latency', type=float, default=0.05, help="seconds per API response")
+	parser.add_argument('--fake-port', type=int, default=0, help="port of the fake API (default: any)")
+	parser.add_argument('--url', help="app already running here (default: run it in this process)")
+	parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+	args = parser.parse_args(argv)
+
+	import flask_main
+	from werkzeug.serving import make_server
+	logging.getLogger('werkzeug').setLevel(logging.WARNING)
+	flask_main.app.logger.setLevel(logging.WARNING)
+
+	with FakeCalendarServer(args.calendars, args.events, args.days, args.page_size,
+			args.latency, port=args.fake_port) as fake:
+		flask_main.DISCOVERY_URL = fake.url + DISCOVERY_PATH
+		flask_main.DISCOVERY_DOCUMENT = None
+		server = None
+		base_url = args.url
+		if base_url is None:
+			server = make_server('127.0.0.1', 0, flask_main.app, threaded=True)
+			threading.Thread(target=server.serve_forever, daemon=True).start()
+			base_url = 'http://127.0.0.1:{}'.format(server.server_port)
+		cookies = [session_cookie(flask_main.app, session_values('user{}'.format(n),
+			fake.url + '/token', days=args.days)) for n in range(args.users)]
+		form = urllib.parse.urlencode([('calendar', calendar['id']) for calendar in fake.calendars])
+		steps = [('choose', 'GET', '/choose', None), ('display', 'POST', '/display', form)]
+		try:
+			samples, elapsed = run_load(base_url.rstrip('/'), steps, cookies, args.requests)
+		finally:
+			if server is not None:
+				server.shutdown()
+		summary = summarize(samples, elapsed)
+		if args.json:
+			print(json.dumps({'summary': summary, 'api_requests': fake.requests}, indent=2))
+		else:
+			report(summary)
+			print("\nAPI requests: " + ", ".join("{} {}".format(method, count)
+				for method, count in sorted(fake.requests.items())))
+	return 1 if summary.get('all', {}).get('errors') else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
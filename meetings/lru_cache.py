@@ -0,0 +1,95 @@
+import collections
+import threading
+import time
+
+class LRUCache:
+	"""
+	Thread-safe least-recently-used cache with an optional time to
+	live.  Holds at most maxsize entries, and if maxweight is set, at
+	most that total weight (see put); entries older than ttl seconds
+	are treated as missing.  Counts hits, misses and evictions for
+	monitoring.
+	"""
+	def __init__(self, maxsize=128, ttl=None, clock=time.monotonic, maxweight=None):
+		self.maxsize = maxsize
+		self.maxweight = maxweight
+		self.weight = 0
+		self.ttl = ttl
+		self.clock = clock
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._entries = collections.OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key, default=None):
+		"""
+		Value stored under key, or default if it is missing or expired.
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None and self.ttl is not None and self.clock() - entry[1] > self.ttl:
+				del self._entries[key]
+				self.weight -= entry[2]
+				entry = None
+			if entry is None:
+				self.misses += 1
+				return default
+			self._entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def put(self, key, value, weight=1):
+		"""
+		Store value under key, evicting the least recently used
+		entries beyond maxsize or maxweight.  weight is what the entry
+		counts towards maxweight, such as its number of items.
+		"""
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self.weight -= old[2]
+			self._entries[key] = (value, self.clock(), weight)
+			self.weight += weight
+			while len(self._entries) > 1 and (len(self._entries) > self.maxsize
+					or (self.maxweight is not None and self.weight > self.maxweight)):
+				evicted = self._entries.popitem(last=False)[1]
+				self.weight -= evicted[2]
+				self.evictions += 1
+
+	def get_or_create(self, key, factory):
+		"""
+		Value stored under key, storing factory() first if missing.
+		"""
+		missing = object()
+		value = self.get(key, missing)
+		if value is missing:
+			value = factory()
+			self.put(key, value)
+		return value
+
+	def pop(self, key, default=None):
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is not None:
+				self.weight -= entry[2]
+		return default if entry is None else entry[0]
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self.weight = 0
+
+	def __len__(self):
+		with self._lock:
+			return len(self._entries)
+
+	def stats(self):
+		"""
+		Counters as a dict.
+		"""
+		stats = {'size': len(self._entries), 'maxsize': self.maxsize,
+			'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+		if self.maxweight is not None:
+			stats.update(weight=self.weight, maxweight=self.maxweight)
+		return stats
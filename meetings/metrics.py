@@ -0,0 +1,138 @@
+import bisect
+import contextlib
+import threading
+import time
+
+import flask
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Counter:
+	"""
+	Monotonic counts, one per set of label values.
+	"""
+	kind = 'counter'
+
+	def __init__(self, name, help, labels=()):
+		self.name = name
+		self.help = help
+		self.labels = labels
+		self._values = {}
+		self._lock = threading.Lock()
+
+	def inc(self, *label_values, amount=1):
+		with self._lock:
+			self._values[label_values] = self._values.get(label_values, 0) + amount
+
+	def samples(self):
+		with self._lock:
+			values = dict(self._values)
+		for label_values, value in sorted(values.items()):
+			yield self.name, label_text(self.labels, label_values), value
+
+class Histogram:
+	"""
+	Observations counted into fixed buckets, one histogram per set of
+	label values.  Observing is a bisect and three additions.
+	"""
+	kind = 'histogram'
+
+	def __init__(self, name, help, labels=(), buckets=BUCKETS):
+		self.name = name
+		self.help = help
+		self.labels = labels
+		self.buckets = buckets
+		self._series = {}
+		self._lock = threading.Lock()
+
+	def observe(self, value, *label_values):
+		with self._lock:
+			series = self._series.get(label_values)
+			if series is None:
+				# per-bucket counts (the last one past every bound), sum, count
+				series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+			series[bisect.bisect_left(self.buckets, value)] += 1
+			series[-2] += value
+			series[-1] += 1
+
+	def samples(self):
+		with self._lock:
+			series = {key: list(value) for key, value in self._series.items()}
+		for label_values, values in sorted(series.items()):
+			cumulative = 0
+			for bound, count in zip(self.buckets, values):
+				cumulative += count
+				yield (self.name + '_bucket',
+					label_text(self.labels + ('le',), label_values + (repr(bound),)), cumulative)
+			yield (self.name + '_bucket',
+				label_text(self.labels + ('le',), label_values + ('+Inf',)), values[-1])
+			yield self.name + '_sum', label_text(self.labels, label_values), values[-2]
+			yield self.name + '_count', label_text(self.labels, label_values), values[-1]
+
+def label_text(names, values):
+	if not names:
+		return ''
+	pairs = ['{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+		for name, value in zip(names, values)]
+	return '{' + ','.join(pairs) + '}'
+
+class Registry:
+	"""
+	The metrics served at /metrics.
+	"""
+	def __init__(self):
+		self.metrics = []
+
+	def register(self, metric):
+		self.metrics.append(metric)
+		return metric
+
+	def exposition(self):
+		"""
+		All metrics in the Prometheus text format.
+		"""
+		lines = []
+		for metric in self.metrics:
+			lines.append('# HELP {} {}'.format(metric.name, metric.help))
+			lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+			for name, labels, value in metric.samples():
+				lines.append('{}{} {}'.format(name, labels, value))
+		return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram('meetings_stage_seconds',
+	'Time spent in each stage of handling a request.', ('stage',)))
+REQUEST_SECONDS = REGISTRY.register(Histogram('meetings_request_seconds',
+	'Time to handle a request.', ('endpoint',)))
+REQUESTS = REGISTRY.register(Counter('meetings_requests_total',
+	'Requests handled.', ('endpoint', 'status')))
+
+@contextlib.contextmanager
+def span(stage):
+	"""
+	Time the enclosed block as stage, in the stage histogram.  It
+	needs no request context, so it works in fetch threads too.
+	"""
+	begin = time.perf_counter()
+	try:
+		yield
+	finally:
+		STAGE_SECONDS.observe(time.perf_counter() - begin, stage)
+
+def instrument(app):
+	"""
+	Count and time every request to app.
+	"""
+	@app.before_request
+	def start_timer():
+		flask.g.request_started = time.perf_counter()
+
+	@app.after_request
+	def record_request(response):
+		endpoint = flask.request.endpoint or '(none)'
+		started = flask.g.get('request_started')
+		if started is not None:
+			REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint)
+		REQUESTS.inc(endpoint, str(response.status_code))
+		return response
@@ -0,0 +1,123 @@
+"""
+Local expansion of recurring events.
+
+Listing events with singleEvents=True makes Google send every
+instance of a recurring event as its own item: a daily standup over
+a year is 365 items.  With singleEvents=False it sends the recurring
+event once, with its RRULE/EXDATE/RDATE lines, plus only the
+instances that were moved, changed or cancelled.  expand_items turns
+such a listing into the instances that fall in the query window,
+using dateutil.rrule, so the busy times come out the same as with
+singleEvents=True.
+"""
+import datetime
+import itertools
+import logging
+
+from dateutil import rrule, tz
+
+from formatting import as_datetime, epoch
+
+logger = logging.getLogger(__name__)
+
+# Instances expanded per recurring event when the window is open-ended
+MAX_INSTANCES = 2500
+
+# Fields we keep of an event resource in singleEvents=False listings
+ITEM_FIELDS = ('kind', 'id', 'etag', 'updated', 'status', 'summary', 'description', 'start', 'end',
+	'recurrence', 'recurringEventId', 'originalStartTime')
+
+def trim_item(item):
+	"""
+	item with only the fields expand_items and event_record use.
+	"""
+	return {field: item[field] for field in ITEM_FIELDS if field in item}
+
+def expand_items(items, time_min=None, time_max=None):
+	"""
+	Yields the event resources of a singleEvents=False listing the
+	way a singleEvents=True listing would have them: recurring events
+	are replaced by their instances overlapping time_min to time_max
+	(ISO strings), less the instances that were cancelled or moved.
+	Moved and changed instances come through as Google sent them.
+	Cancelled items are dropped.  Not in start order.
+	"""
+	items = list(items)
+	# instances handled on their own, by recurring event id
+	exceptions = {}
+	for item in items:
+		if 'recurringEventId' in item and 'originalStartTime' in item:
+			exceptions.setdefault(item['recurringEventId'], set()).add(
+				original_start(item['originalStartTime']))
+	window = (as_datetime(time_min) if time_min else None,
+		as_datetime(time_max) if time_max else None)
+	for item in items:
+		if item.get('status') == 'cancelled':
+			continue
+		if 'recurrence' in item and 'start' in item:
+			yield from instances(item, window, exceptions.get(item['id'], ()))
+		else:
+			yield item
+
+def original_start(moment):
+	"""
+	Key for an instance's originalStartTime (or start): epoch
+	seconds for timed events, the date text for all-day ones.
+	"""
+	if 'dateTime' in moment:
+		return epoch(as_datetime(moment['dateTime']))
+	return moment['date']
+
+def instances(item, window, excluded=()):
+	"""
+	Yields the instances of recurring event item that overlap
+	window, a (start, end) pair of aware datetimes or Nones,
+	skipping those whose original start is in excluded.
+	"""
+	all_day = 'dateTime' not in item['start']
+	if all_day:
+		first = datetime.datetime.strptime(item['start']['date'], '%Y-%m-%d')
+		duration = datetime.datetime.strptime(item['end']['date'], '%Y-%m-%d') - first
+	else:
+		first = as_datetime(item['start']['dateTime'])
+		duration = as_datetime(item['end']['dateTime']) - first
+		zone = item['start'].get('timeZone')
+		if zone and tz.gettz(zone) is not None:
+			# repeat at the same wall-clock time across DST changes
+			first = first.astimezone(tz.gettz(zone))
+	rules = rrule.rrulestr("\n".join(item['recurrence']), dtstart=first,
+		forceset=True, unfold=True)
+
+	after, before = window
+	if all_day:
+		# all-day instances have no zone: pad the window by a day
+		# and let the day filtering downstream do the rest
+		after = after and after.replace(tzinfo=None) - datetime.timedelta(days=1)
+		before = before and before.replace(tzinfo=None) + datetime.timedelta(days=1)
+	if after is not None:
+		after = after - duration
+	if after is not None and before is not None:
+		starts = rules.between(after, before)
+	else:
+		starts = itertools.islice(rules.xafter(after, inc=False) if after is not None else rules,
+			MAX_INSTANCES)
+
+	for start in starts:
+		if before is not None and start >= before:
+			break
+		end = start + duration
+		if all_day:
+			key = start.strftime('%Y-%m-%d')
+			instance_id = start.strftime('%Y%m%d')
+			times = ({'date': key}, {'date': end.strftime('%Y-%m-%d')})
+		else:
+			key = epoch(start)
+			instance_id = start.astimezone(tz.tzutc()).strftime('%Y%m%dT%H%M%SZ')
+			times = ({'dateTime': start.isoformat()}, {'dateTime': end.isoformat()})
+		if key in excluded:
+			continue
+		instance = dict(item, id="{}_{}".format(item['id'], instance_id),
+			start=times[0], end=times[1], recurringEventId=item['id'],
+			originalStartTime=times[0])
+		del instance['recurrence']
+		yield instance
@@ -0,0 +1,146 @@
+import contextlib
+import json
+import logging
+import sqlite3
+import time
+import uuid
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from lru_cache import LRUCache
+
+def encode(data):
+	"""
+	Compact JSON for session contents.
+	"""
+	return json.dumps(data, separators=(',', ':'))
+
+def decode(text):
+	return json.loads(text)
+
+class MemorySessionBackend:
+	"""
+	Sessions kept in this process: at most maxsize of them, each for
+	ttl seconds after it was last saved.
+	"""
+	def __init__(self, maxsize=10000, ttl=86400):
+		self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+		self.ttl = ttl
+
+	def load(self, sid):
+		text = self.cache.get(sid)
+		return None if text is None else decode(text)
+
+	def save(self, sid, data):
+		self.cache.put(sid, encode(data))
+
+	def delete(self, sid):
+		self.cache.pop(sid)
+
+class SQLiteSessionBackend:
+	"""
+	Sessions kept in an SQLite file, so gunicorn workers can share
+	them.  Each lasts ttl seconds after it was last saved.
+	"""
+	def __init__(self, path, ttl=86400):
+		self.path = path
+		self.ttl = ttl
+		with self._connect() as db:
+			db.execute("CREATE TABLE IF NOT EXISTS sessions ("
+				"id TEXT PRIMARY KEY, data TEXT, expires REAL)")
+
+	@contextlib.contextmanager
+	def _connect(self):
+		"""
+		A connection for one transaction, closed afterwards.
+		"""
+		db = sqlite3.connect(self.path, timeout=10)
+		try:
+			with db:
+				yield db
+		finally:
+			db.close()
+
+	def load(self, sid):
+		with self._connect() as db:
+			row = db.execute("SELECT data FROM sessions WHERE id = ? AND expires > ?",
+				(sid, time.time())).fetchone()
+		return None if row is None else decode(row[0])
+
+	def save(self, sid, data):
+		now = time.time()
+		with self._connect() as db:
+			db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+				(sid, encode(data), now + self.ttl))
+			db.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+
+	def delete(self, sid):
+		with self._connect() as db:
+			db.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+class ServerSession(CallbackDict, SessionMixin):
+	"""
+	flask.session contents, kept on the server under sid.
+	"""
+	def __init__(self, initial=None, sid=None, new=False):
+		def on_update(self):
+			self.modified = True
+		CallbackDict.__init__(self, initial, on_update)
+		self.sid = sid
+		self.new = new
+		self.modified = False
+		self.replaced = None
+
+	def regenerate(self):
+		"""
+		Move the contents to a fresh session ID, as when the user
+		signs in, so an ID known before then (session fixation)
+		leads nowhere.  The old ID is deleted when the session is saved.
+		"""
+		if not self.new and self.replaced is None:
+			self.replaced = self.sid
+		self.sid = uuid.uuid4().hex
+		self.modified = True
+
+class ServerSideSessionInterface(SessionInterface):
+	"""
+	Keeps flask.session on the server, in backend.  The session cookie
+	only carries a random session ID, so requests stay small and
+	nothing has to be verified and deserialized from the cookie.
+	"""
+	def __init__(self, backend=None):
+		self.backend = backend if backend is not None else MemorySessionBackend()
+
+	def cookie_name(self, app):
+		return app.config.get('SESSION_COOKIE_NAME', 'session')
+
+	def open_session(self, app, request):
+		sid = request.cookies.get(self.cookie_name(app))
+		if sid:
+			data = self.backend.load(sid)
+			if data is not None:
+				return ServerSession(data, sid=sid)
+		return ServerSession(sid=uuid.uuid4().hex, new=True)
+
+	def save_session(self, app, session, response):
+		domain = self.get_cookie_domain(app)
+		path = self.get_cookie_path(app)
+		# the page depends on whose session it is: keep caches apart
+		response.vary.add('Cookie')
+		if session.replaced is not None:
+			self.backend.delete(session.replaced)
+			session.replaced = None
+		if not session:
+			if session.modified and not session.new:
+				self.backend.delete(session.sid)
+				response.delete_cookie(self.cookie_name(app), domain=domain, path=path)
+			return
+		if not (session.modified or session.new or self.should_set_cookie(app, session)):
+			return
+		self.backend.save(session.sid, dict(session))
+		response.set_cookie(self.cookie_name(app), session.sid,
+			expires=self.get_expiration_time(app, session),
+			httponly=self.get_cookie_httponly(app),
+			domain=domain, path=path,
+			secure=self.get_cookie_secure(app))
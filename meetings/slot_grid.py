@@ -0,0 +1,76 @@
+import logging
+import numpy as np
+
+from free_times import event_intervals
+from intervals import Interval
+
+def calculate_free_grid(event_lists, start_time, end_time, slot=900, quorum=None):
+	"""
+	Calculate free times on a grid of fixed-length slots.
+
+	event_lists holds one list of busy events per calendar; slot is
+	the slot length in seconds.  A busy event blocks every slot it
+	touches.  Returns a list of [iso_start, iso_end] pairs, in the
+	timezone of start_time, during which at least quorum calendars
+	are free (all of them if quorum is None).
+	"""
+	span = Interval.parse(start_time, end_time)
+	busy_lists = []
+	for events in event_lists:
+		busy_lists.append([(interval.start, interval.end) for interval in event_intervals(events)])
+	grid = busy_grid(busy_lists, span.start, span.end, slot)
+	free = free_slots(grid, quorum)
+	free_times = []
+	for free_start, free_end in slot_runs(free, span.start, span.end, slot):
+		free_times.append(Interval(free_start, free_end, span.tzinfo).isoformat())
+	return free_times
+
+def busy_grid(busy_lists, range_start, range_end, slot):
+	"""
+	Boolean array of shape (calendars, slots), True where a calendar
+	is busy.  busy_lists holds (start, end) epoch pairs per calendar.
+
+	All intervals are turned into +1/-1 marks on one difference array
+	and summed along the slot axis, so there is no Python loop over
+	slots.
+	"""
+	slots = -(-(range_end - range_start) // slot)
+	calendars = len(busy_lists)
+	rows = np.repeat(np.arange(calendars), [len(busy) for busy in busy_lists])
+	bounds = np.array([pair for busy in busy_lists for pair in busy], dtype=np.int64).reshape(-1, 2)
+	first = np.clip((bounds[:, 0] - range_start) // slot, 0, slots)
+	last = np.clip(-(-(bounds[:, 1] - range_start) // slot), 0, slots)
+	keep = first < last
+	marks = np.zeros((calendars, slots + 1), dtype=np.int32)
+	np.add.at(marks, (rows[keep], first[keep]), 1)
+	np.add.at(marks, (rows[keep], last[keep]), -1)
+	return np.cumsum(marks, axis=1)[:, :slots] > 0
+
+def free_slots(grid, quorum=None):
+	"""
+	Boolean slot vector, True where at least quorum calendars of the
+	grid are free (all of them if quorum is None).  With no calendars
+	(and no quorum) every slot is free, as in group_free.
+	"""
+	calendars = grid.shape[0]
+	if not calendars:
+		if quorum is not None:
+			raise ValueError("quorum given, but there are no calendars")
+		return np.ones(grid.shape[1], dtype=bool)
+	if quorum is None:
+		quorum = calendars
+	if not 0 < quorum <= calendars:
+		raise ValueError("quorum must be between 1 and {}".format(calendars))
+	if quorum == calendars:
+		return ~grid.any(axis=0)
+	return (calendars - grid.sum(axis=0)) >= quorum
+
+def slot_runs(free, range_start, range_end, slot):
+	"""
+	Convert runs of True slots back to (start, end) epoch pairs.
+	The last slot is clipped to range_end.
+	"""
+	edges = np.diff(np.concatenate(([0], free.astype(np.int8), [0])))
+	run_starts = np.flatnonzero(edges == 1) * slot + range_start
+	run_ends = np.minimum(np.flatnonzero(edges == -1) * slot + range_start, range_end)
+	return list(zip(run_starts.tolist(), run_ends.tolist()))
@@ -0,0 +1,122 @@
+"""
+Worker start-up: lazy imports, and how long imports take.
+
+The Google client libraries (oauth2client and apiclient, and the
+httplib2 they bring along) are the slowest part of importing
+flask_main, and only the OAuth and calendar routes use them.
+flask_main holds them as LazyModules,
+which import on first use, so a fresh worker can answer its first
+request sooner.  flask_main.warm() imports them and fetches the
+discovery document up front instead; with PRELOAD set in the
+configuration and gunicorn --preload, that happens once in the
+master and the forked workers share it.
+
+Import times are measured in fresh interpreters:
+
+    python3 startup.py                  # flask_main, lazy and eager
+    python3 startup.py arrow httplib2 --top 5
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import threading
+
+# What importing flask_main used to load up front
+GOOGLE_MODULES = ['oauth2client.client', 'httplib2', 'apiclient.discovery']
+
+class LazyModule:
+	"""
+	Stands in for the module name, importing it on first attribute
+	access.
+	"""
+	def __init__(self, name):
+		self._name = name
+		self._module = None
+		self._lock = threading.Lock()
+
+	def load(self):
+		"""
+		The module, imported now if it wasn't yet.
+		"""
+		if self._module is None:
+			with self._lock:
+				if self._module is None:
+					self._module = importlib.import_module(self._name)
+		return self._module
+
+	@property
+	def loaded(self):
+		return self._module is not None
+
+	def __getattr__(self, attr):
+		return getattr(self.load(), attr)
+
+	def __repr__(self):
+		return "<LazyModule {} ({})>".format(self._name,
+			"loaded" if self.loaded else "not loaded")
+
+def run_python(code, *options):
+	"""
+	(stdout, stderr) of code run in a fresh interpreter in this
+	directory.
+	"""
+	here = os.path.dirname(os.path.abspath(__file__))
+	result = subprocess.run([sys.executable] + list(options) + ['-c', code],
+		cwd=here, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+		universal_newlines=True, check=True)
+	return result.stdout, result.stderr
+
+def import_seconds(modules, repeat=3):
+	"""
+	Best of repeat wall-clock times, in seconds, for importing
+	modules (names) one after another in a fresh interpreter.
+	"""
+	code = ("import importlib, time\n"
+		"begin = time.perf_counter()\n"
+		"for name in {!r}: importlib.import_module(name)\n"
+		"print(time.perf_counter() - begin)").format(list(modules))
+	return min(float(run_python(code)[0]) for _ in range(repeat))
+
+def import_breakdown(modules, top=10):
+	"""
+	The top slowest (cumulative microseconds, module) imports when
+	importing modules, from python -X importtime.
+	"""
+	code = "".join("import {}\n".format(name) for name in modules)
+	entries = []
+	for line in run_python(code, '-X', 'importtime')[1].splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		fields = line[len('import time:'):].split('|')
+		entries.append((int(fields[1]), fields[2].strip()))
+	return sorted(entries, reverse=True)[:top]
+
+def report(modules, top=10, repeat=3, output=sys.stdout):
+	"""
+	Write import times for modules; for flask_main also the time
+	with the Google client libraries imported eagerly.
+	"""
+	runs = [(' '.join(modules), modules)]
+	if 'flask_main' in modules:
+		runs.append(("flask_main, eager Google imports",
+			list(modules) + [name for name in GOOGLE_MODULES if name not in modules]))
+	for title, names in runs:
+		output.write("{:50} {:8.1f} ms\n".format(title, 1000 * import_seconds(names, repeat)))
+	output.write("\nslowest imports (cumulative):\n")
+	for microseconds, name in import_breakdown(runs[-1][1], top):
+		output.write("  {:48} {:8.1f} ms\n".format(name, microseconds / 1000))
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Measure module import times")
+	parser.add_argument('modules', nargs='*', default=['flask_main'],
+		help="modules to import (default: flask_main)")
+	parser.add_argument('--top', type=int, default=10, help="slowest imports to list")
+	parser.add_argument('--repeat', type=int, default=3, help="runs to take the best of")
+	args = parser.parse_args(argv)
+	report(args.modules, args.top, args.repeat)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
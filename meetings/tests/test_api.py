@@ -0,0 +1,111 @@
+from intervals import Event
+import nose    # Testing framework
+import logging
+import json
+
+try:
+	import flask_main
+except ImportError as error:
+	# flask_main needs the deployment's config module and Google client libraries
+	raise nose.SkipTest("flask_main not importable: {}".format(error))
+
+RANGE = {'begin_date': '2017-11-09T00:00:00-08:00', 'end_date': '2017-11-09T23:59:59-08:00',
+	'begin_time': '2017-11-09T09:00:00-08:00', 'end_time': '2017-11-09T17:00:00-08:00'}
+LUNCH = Event.from_record({'id': 'lunch', 'summary': 'Lunch',
+	'start': '2017-11-09T12:00:00-08:00', 'end': '2017-11-09T13:00:00-08:00'})
+
+
+def fake_selected_events(credentials, cal_ids, bounds, in_order=True):
+	for cal_id in cal_ids:
+		if cal_id == 'down':
+			yield cal_id, None, IOError("calendar unavailable")
+		else:
+			yield cal_id, (None, [LUNCH], [LUNCH]), None
+
+def api_client(signed_in=True, session=None):
+	"""
+	Test client with valid_credentials and selected_events replaced
+	by local stand-ins; call the returned restore() when done.
+	"""
+	saved = flask_main.valid_credentials, flask_main.selected_events
+	flask_main.valid_credentials = lambda: object() if signed_in else None
+	flask_main.selected_events = fake_selected_events
+	client = flask_main.app.test_client()
+	if session:
+		with client.session_transaction() as values:
+			values.update(session)
+	def restore():
+		flask_main.valid_credentials, flask_main.selected_events = saved
+	return client, restore
+
+def lines(response):
+	return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_api_needs_range():
+	"""
+	Without a range in the session both endpoints answer 400 with a
+	JSON error, not a 500.
+	"""
+	client, restore = api_client()
+	try:
+		for path in ('/api/busy', '/api/free'):
+			response = client.get(path + '?calendar=a')
+			assert response.status_code == 400
+			assert 'error' in response.get_json()
+	finally:
+		restore()
+
+def test_api_needs_credentials():
+	"""
+	Signed-out requests get a 401.
+	"""
+	client, restore = api_client(signed_in=False, session=RANGE)
+	try:
+		for path in ('/api/busy', '/api/free'):
+			assert client.get(path + '?calendar=a').status_code == 401
+	finally:
+		restore()
+
+def test_api_busy_lines():
+	"""
+	Busy events stream one JSON line each; a failed calendar gets an
+	error line.
+	"""
+	client, restore = api_client(session=RANGE)
+	try:
+		response = client.get('/api/busy?calendar=a&calendar=down')
+		assert response.status_code == 200
+		assert response.mimetype == 'application/x-ndjson'
+		assert lines(response) == [
+			{'calendar': 'a', 'id': 'lunch', 'summary': 'Lunch',
+				'start': LUNCH['start'], 'end': LUNCH['end']},
+			{'calendar': 'down', 'error': 'calendar unavailable'}]
+	finally:
+		restore()
+
+def test_api_free_lines():
+	"""
+	Free times stream as start/end lines.
+	"""
+	client, restore = api_client(session=RANGE)
+	try:
+		response = client.post('/api/free', data={'calendar': ['a']})
+		records = lines(response)
+		assert response.status_code == 200
+		assert records and all(set(record) == {'start', 'end'} for record in records)
+	finally:
+		restore()
+
+def test_api_free_failed_calendar():
+	"""
+	If a calendar fails, its error is sent and no free times, since
+	they might be busy in it.
+	"""
+	client, restore = api_client(session=RANGE)
+	try:
+		for cal_ids in (['down', 'a'], ['down']):
+			response = client.post('/api/free', data={'calendar': cal_ids})
+			assert lines(response) == [{'calendar': 'down', 'error': 'calendar unavailable'}]
+	finally:
+		restore()
@@ -0,0 +1,57 @@
+from batch_free import free_record, run_batch, main
+import nose    # Testing framework
+import json
+import logging
+import os
+import tempfile
+
+
+def dump(user, events, **extra):
+	record = dict(user=user, events=events, **extra)
+	return json.dumps(record) + "\n"
+
+BUSY = [{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T11:20:00-08:00'}]
+START = '2017-11-09T08:00:00-08:00'
+END = '2017-11-09T12:00:00-08:00'
+
+
+def test_free_record():
+	"""
+	One dump line gives one result line.
+	"""
+	result = json.loads(free_record(dump('ann', BUSY, start=START, end=END)))
+
+	assert result == {'user': 'ann', 'free': [['2017-11-09T08:00:00-08:00', '2017-11-09T10:00:00-08:00'], ['2017-11-09T11:20:00-08:00', '2017-11-09T12:00:00-08:00']]}
+
+def test_free_record_error():
+	"""
+	A bad dump is reported, not raised.
+	"""
+	result = json.loads(free_record(dump('bob', BUSY)))
+
+	assert result['user'] == 'bob' and 'error' in result
+
+def test_run_batch_in_order():
+	"""
+	Results keep the input order across the process pool.
+	"""
+	lines = [dump('user{}'.format(n), BUSY) for n in range(20)]
+	results = [json.loads(line) for line in run_batch(iter(lines), workers=2, window=3, start=START, end=END)]
+
+	assert [result['user'] for result in results] == ['user{}'.format(n) for n in range(20)]
+	assert all(len(result['free']) == 2 for result in results)
+
+def test_main_files():
+	"""
+	Reads dump files and writes a JSONL report.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		dumps = os.path.join(directory, 'dump.jsonl')
+		report = os.path.join(directory, 'report.jsonl')
+		with open(dumps, 'w') as output:
+			output.write(dump('ann', BUSY) + "\n" + dump('bob', []))
+		main([dumps, '-o', report, '--workers', '1', '--start', START, '--end', END])
+		with open(report) as results:
+			users = [json.loads(line)['user'] for line in results]
+
+	assert users == ['ann', 'bob']
@@ -0,0 +1,26 @@
+from benchmark import synthetic_items, run_benchmarks, regressions
+import nose    # Testing framework
+import logging
+
+
+def test_synthetic_items():
+	"""
+	Generator makes the requested mix of events, sorted by start.
+	"""
+	items = synthetic_items(200, days=3, all_day=0.5, seed=1)
+	starts = [item['start'].get('dateTime', item['start'].get('date')) for item in items]
+
+	assert len(items) == 200
+	assert starts == sorted(starts)
+	assert 50 < sum('date' in item['start'] for item in items) < 150
+
+def test_run_and_compare():
+	"""
+	Every stage is timed, and slowdowns against a baseline are caught.
+	"""
+	results = run_benchmarks(sizes=[20], repeat=1)
+	baseline = {'render': {'20': {'seconds': results['render']['20']['seconds'] / 10}}}
+
+	assert set(results) == {'list_events', 'time_order', 'calculate_free', 'calculate_free_daily', 'render'}
+	assert regressions(results, results) == []
+	assert len(regressions(results, baseline)) == 1
@@ -0,0 +1,152 @@
+from calendar_fetch import fetch_calendars, iter_calendars, per_thread
+import concurrent.futures
+import nose    # Testing framework
+import logging
+import threading
+import time
+
+
+class FakeService:
+	"""
+	Local stand-in for the Google calendar service object.
+	"""
+	def __init__(self, calendars, delays=None):
+		self.calendars = calendars
+		self.delays = delays or {}
+
+	def events(self):
+		return self
+
+	def list(self, calendarId, **kwargs):
+		self.cal_id = calendarId
+		return self
+
+	def execute(self):
+		time.sleep(self.delays.get(self.cal_id, 0))
+		if self.calendars[self.cal_id] is None:
+			raise IOError("calendar unavailable")
+		return {'items': self.calendars[self.cal_id]}
+
+def fake_fetch(calendars, delays=None):
+	service = per_thread(lambda: FakeService(calendars, delays))
+	return lambda cal_id: service().events().list(calendarId=cal_id).execute()['items']
+
+
+def test_fetch_in_order():
+	"""
+	Results come back in calendar order.
+	"""
+	calendars = {'a': [1], 'b': [2, 3], 'c': []}
+	fetch = fake_fetch(calendars, {'a': 0.05})
+
+	assert fetch_calendars(fetch, ['a', 'b', 'c']) == [('a', [1], None), ('b', [2, 3], None), ('c', [], None)]
+
+def test_fetch_concurrent():
+	"""
+	Slow calendars are fetched at the same time.
+	"""
+	calendars = {cal_id: [] for cal_id in 'abcd'}
+	fetch = fake_fetch(calendars, {cal_id: 0.2 for cal_id in 'abcd'})
+	begin = time.monotonic()
+	fetch_calendars(fetch, 'abcd', max_workers=4)
+
+	assert time.monotonic() - begin < 0.6
+
+def test_fetch_failure_isolated():
+	"""
+	A failing calendar only loses its own result.
+	"""
+	calendars = {'a': [1], 'b': None}
+	results = fetch_calendars(fake_fetch(calendars), ['a', 'b'])
+
+	assert results[0] == ('a', [1], None)
+	assert results[1][1] is None and isinstance(results[1][2], IOError)
+
+def test_fetch_timeout():
+	"""
+	A slow calendar times out without holding up the others.
+	"""
+	calendars = {'a': [1], 'b': [2]}
+	fetch = fake_fetch(calendars, {'b': 1.0})
+	begin = time.monotonic()
+	results = fetch_calendars(fetch, ['a', 'b'], timeout=0.2)
+
+	assert time.monotonic() - begin < 0.8
+	assert results[0] == ('a', [1], None)
+	assert isinstance(results[1][2], TimeoutError)
+
+def test_per_thread():
+	"""
+	Each thread gets its own object.
+	"""
+	get = per_thread(object)
+	seen = []
+	thread = threading.Thread(target=lambda: seen.append(get()))
+	thread.start()
+	thread.join()
+
+	assert get() is get()
+	assert seen[0] is not get()
+
+def test_iter_as_completed():
+	"""
+	Calendars come out as soon as they are done.
+	"""
+	calendars = {'slow': [1], 'fast': [2]}
+	fetch = fake_fetch(calendars, {'slow': 0.2})
+
+	assert [result[0] for result in iter_calendars(fetch, ['slow', 'fast'])] == ['fast', 'slow']
+
+def test_shared_executor():
+	"""
+	A long-lived executor is reused, not shut down, so its threads
+	keep their per-thread state from call to call.
+	"""
+	executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+	made = []
+	service = per_thread(lambda: made.append(1) or FakeService({'a': [1], 'b': [2]}))
+	fetch = lambda cal_id: service().events().list(calendarId=cal_id).execute()['items']
+	for _ in range(5):
+		results = fetch_calendars(fetch, ['a', 'b'], executor=executor)
+		assert [result for _, result, _ in results] == [[1], [2]]
+	executor.shutdown()
+
+	assert len(made) <= 2
+
+def test_timeout_per_calendar():
+	"""
+	With more calendars than workers, each calendar's time only runs
+	once its fetch starts, so queued calendars don't time out.
+	"""
+	calendars = {str(n): [n] for n in range(12)}
+	fetch = fake_fetch(calendars, {cal_id: 0.3 for cal_id in calendars})
+	results = fetch_calendars(fetch, sorted(calendars), max_workers=4, timeout=0.5)
+
+	assert all(error is None for _, _, error in results)
+	assert [result for _, result, _ in results] == [calendars[cal_id] for cal_id in sorted(calendars)]
+
+def test_shared_executor_bounded():
+	"""
+	One call keeps at most max_workers of a shared executor's
+	threads busy, so another call's calendar isn't starved.
+	"""
+	executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+	lock = threading.Lock()
+	running = [0, 0]
+	def slow(cal_id):
+		with lock:
+			running[0] += 1
+			running[1] = max(running)
+		time.sleep(0.2)
+		with lock:
+			running[0] -= 1
+		return cal_id
+	other = threading.Thread(target=lambda: fetch_calendars(slow, 'abcdefgh', max_workers=2, executor=executor))
+	other.start()
+	time.sleep(0.05)
+	results = fetch_calendars(lambda cal_id: [cal_id], ['fast'], timeout=0.1, executor=executor)
+	other.join()
+	executor.shutdown()
+
+	assert results == [('fast', ['fast'], None)]
+	assert running[1] == 2
@@ -0,0 +1,82 @@
+from column_store import ColumnStore
+from free_times import merge_intervals, calculate_free_daily
+from intervals import Interval
+import nose    # Testing framework
+import logging
+import random
+import tempfile
+from dateutil import tz
+
+UTC = tz.tzutc()
+
+
+def event(start, end):
+	return Interval.parse(start, end)
+
+
+def test_busy_matches_merge():
+	"""
+	Busy blocks from the columns match merging the events in memory.
+	"""
+	rng = random.Random(3)
+	events = []
+	for n in range(3000):
+		start = rng.randrange(0, 10 ** 7, 60)
+		events.append(Interval(start, start + rng.choice([900, 3600, 86400 * 3]), UTC))
+	with tempfile.TemporaryDirectory() as directory:
+		store = ColumnStore(directory)
+		store.write('room', events)
+		for lo, hi in [(0, 10 ** 7), (2 * 10 ** 6, 2 * 10 ** 6 + 86400), (-10, 0)]:
+			inside = sorted(interval for interval in events if interval.end > lo and interval.start < hi)
+			expected = [(block.start, block.end) for block in merge_intervals(inside)]
+			assert [(block.start, block.end) for block in store.busy('room', lo, hi)] == expected
+
+def test_busy_keeps_zone():
+	"""
+	Blocks are shown in the timezone of their first event.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		store = ColumnStore(directory)
+		store.write('room', [event('2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00')])
+		blocks = list(store.busy('room', 0, 2 * 10 ** 9))
+
+	assert blocks[0].isoformat() == ['2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00']
+
+def test_rewrite_and_missing():
+	"""
+	Rewriting a key is seen by the next query; unknown keys are empty.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		store = ColumnStore(directory)
+		store.write('room', [Interval(100, 200, UTC)])
+		assert store.count('room') == 1
+		store.write('room', [Interval(100, 200, UTC), Interval(300, 400, UTC)])
+		assert ColumnStore(directory).count('room') == 2 and store.count('room') == 2
+		assert list(store.busy('other', 0, 1000)) == []
+
+def test_maps_bounded():
+	"""
+	Only maxmaps files stay mapped; evicted ones are mapped again.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		store = ColumnStore(directory, maxmaps=2)
+		for key in ('a', 'b', 'c'):
+			store.write(key, [Interval(100, 200, UTC)])
+			assert store.count(key) == 1
+		assert len(store._maps) == 2
+		assert store.count('a') == 1 and len(store._maps) == 2
+
+def test_feeds_free_daily():
+	"""
+	Busy blocks go straight into calculate_free_daily.
+	"""
+	zone = tz.tzoffset(None, -8 * 3600)
+	day = 17479    # 2017-11-09
+	with tempfile.TemporaryDirectory() as directory:
+		store = ColumnStore(directory)
+		store.write('room', [event('2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00')])
+		free = calculate_free_daily([store.busy('room', 0, 2 * 10 ** 9)], day, day, 9 * 3600, 12 * 3600, zone)
+
+	assert [interval.isoformat() for interval in free] == [
+		['2017-11-09T09:00:00-08:00', '2017-11-09T10:00:00-08:00'],
+		['2017-11-09T11:00:00-08:00', '2017-11-09T12:00:00-08:00']]
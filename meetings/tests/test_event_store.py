@@ -0,0 +1,158 @@
+from event_store import EventStore, MemoryBackend, SQLiteBackend
+from column_store import ColumnStore
+import nose    # Testing framework
+import logging
+import os
+import tempfile
+
+
+class Gone(Exception):
+	"""
+	Stand-in for the HttpError raised on an expired sync token.
+	"""
+	class resp:
+		status = 410
+
+class FakeService:
+	"""
+	Local stand-in for the Google calendar service, returning deltas
+	after the first full listing.  Pages hold two items each.
+	"""
+	def __init__(self, items):
+		self.items = list(items)
+		self.changes = []
+		self.version = 0
+		self.queries = []
+
+	def change(self, item):
+		self.changes.append(item)
+		self.version += 1
+
+	def events(self):
+		return self
+
+	def list(self, **query):
+		self.query = query
+		self.queries.append(query)
+		return self
+
+	def execute(self):
+		token = self.query.get('syncToken')
+		if token == 'expired':
+			raise Gone()
+		if token is None:
+			items = self.items + self.changes
+		else:
+			items = self.changes[int(token):]
+		first = int(self.query.get('pageToken') or 0)
+		page = {'items': items[first:first + 2]}
+		if first + 2 < len(items):
+			page['nextPageToken'] = str(first + 2)
+		else:
+			page['nextSyncToken'] = str(len(self.changes))
+		return page
+
+def item(id, start, end, status='confirmed'):
+	return {'kind': 'calendar#event', 'id': id, 'status': status,
+		'start': {'dateTime': start}, 'end': {'dateTime': end}}
+
+def ids(events):
+	return [event['id'] for event in events]
+
+
+def test_store_applies_deltas():
+	"""
+	Later requests only fetch and apply changes.
+	"""
+	service = FakeService([
+		item('a', '2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00'),
+		item('b', '2017-11-09T09:00:00-08:00', '2017-11-09T09:30:00-08:00'),
+		item('c', '2017-11-09T13:00:00-08:00', '2017-11-09T14:00:00-08:00')])
+	store = EventStore()
+
+	assert ids(store.events(service, 'cal', 'user/cal')) == ['b', 'a', 'c']
+	service.change(item('b', '2017-11-09T09:00:00-08:00', '2017-11-09T09:30:00-08:00', 'cancelled'))
+	service.change(item('d', '2017-11-09T08:00:00-08:00', '2017-11-09T08:30:00-08:00'))
+	assert ids(store.events(service, 'cal', 'user/cal')) == ['d', 'a', 'c']
+	assert service.queries[-1]['syncToken'] == '0'
+
+def test_store_resyncs_when_gone():
+	"""
+	An expired sync token falls back to a full listing.
+	"""
+	service = FakeService([item('a', '2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00')])
+	backend = MemoryBackend()
+	backend.put('user/cal', 'expired', {})
+	store = EventStore(backend)
+
+	assert ids(store.events(service, 'cal', 'user/cal', timeMin='2017-11-09T00:00:00-08:00')) == ['a']
+	assert service.queries[-1]['timeMin'] == '2017-11-09T00:00:00-08:00'
+
+def test_sqlite_backend():
+	"""
+	SQLite backend keeps state and evicts least recently used.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		backend = SQLiteBackend(os.path.join(directory, 'events.db'), maxsize=2)
+		backend.put('a', '1', {'x': {'id': 'x'}})
+		backend.put('b', '2', {})
+		backend.get('a')
+		backend.put('c', '3', {})
+
+		assert backend.get('a') == ('1', {'x': {'id': 'x'}})
+		assert backend.get('b') is None
+		assert SQLiteBackend(backend.path).get('c') == ('3', {})
+
+def test_store_expands_recurring():
+	"""
+	Recurring events are listed once and expanded over the range.
+	"""
+	daily = item('m', '2017-11-09T09:00:00-08:00', '2017-11-09T09:15:00-08:00')
+	daily['recurrence'] = ['RRULE:FREQ=DAILY;COUNT=30']
+	service = FakeService([daily])
+	store = EventStore(expand_recurring=True)
+	events = store.events(service, 'cal', 'user/cal',
+		timeMin='2017-11-10T00:00:00-08:00', timeMax='2017-11-12T00:00:00-08:00')
+
+	assert ids(events) == ['m_20171110T170000Z', 'm_20171111T170000Z']
+	assert service.queries[0]['singleEvents'] is False
+	service.change(dict(item('m_20171111T170000Z', '', '', 'cancelled'),
+		recurringEventId='m', originalStartTime={'dateTime': '2017-11-11T09:00:00-08:00'}))
+	assert ids(store.events(service, 'cal', 'user/cal',
+		timeMin='2017-11-10T00:00:00-08:00', timeMax='2017-11-12T00:00:00-08:00')) == ['m_20171110T170000Z']
+
+def test_store_reuses_timeline():
+	"""
+	Without changes the parsed Timeline is handed out again.
+	"""
+	service = FakeService([item('a', '2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00')])
+	store = EventStore()
+	first = store.events(service, 'cal', 'user/cal')
+
+	assert store.events(service, 'cal', 'user/cal') is first
+	assert first.starts == [first[0].start]
+	service.change(item('b', '2017-11-09T09:00:00-08:00', '2017-11-09T09:30:00-08:00'))
+	assert ids(store.events(service, 'cal', 'user/cal')) == ['b', 'a']
+
+def test_store_busy_from_columns():
+	"""
+	busy() syncs into the columns and reads merged busy time back,
+	rewriting the columns only when a sync brings changes.
+	"""
+	service = FakeService([
+		item('a', '2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00'),
+		item('b', '2017-11-09T10:30:00-08:00', '2017-11-09T12:00:00-08:00')])
+	with tempfile.TemporaryDirectory() as directory:
+		columns = ColumnStore(directory)
+		store = EventStore(columns=columns)
+		first = [block.isoformat() for block in store.busy(service, 'cal', 'user/cal', 0, 2 * 10 ** 9)]
+		path = columns.path('user/cal')
+		written = os.stat(path).st_mtime_ns
+		again = [block.isoformat() for block in store.busy(service, 'cal', 'user/cal', 0, 2 * 10 ** 9)]
+		assert os.stat(path).st_mtime_ns == written and again == first
+		service.change(item('c', '2017-11-09T13:00:00-08:00', '2017-11-09T14:00:00-08:00'))
+		changed = [block.isoformat() for block in store.busy(service, 'cal', 'user/cal', 0, 2 * 10 ** 9)]
+
+	assert first == [['2017-11-09T10:00:00-08:00', '2017-11-09T12:00:00-08:00']]
+	assert changed == first + [['2017-11-09T13:00:00-08:00', '2017-11-09T14:00:00-08:00']]
+	assert store.timelines.get('user/cal') is None
@@ -0,0 +1,50 @@
+from formatting import parse_timestamp, parse_clock, parse_us_datetime
+from formatting import iso_timestamp, format_arrow_date, format_arrow_dateTime
+import nose    # Testing framework
+import logging
+import arrow
+
+
+def test_parse_timestamp_matches_arrow():
+	"""
+	The fast path agrees with arrow.get on the forms the API sends.
+	"""
+	for text in ['2017-11-09T10:00:00-08:00', '2017-11-09T10:00:00Z',
+			'2017-11-09T10:00:00.250+05:30', '2017-11-09']:
+		seconds, tzinfo = parse_timestamp(text)
+		moment = arrow.get(text)
+		assert seconds == moment.int_timestamp
+		assert tzinfo.utcoffset(None) == moment.utcoffset()
+
+def test_parse_timestamp_shares_zones():
+	"""
+	Timestamps with the same offset share one tzinfo.
+	"""
+	assert parse_timestamp('2017-11-09T10:00:00-08:00')[1] is parse_timestamp('2017-11-10T09:00:00-08:00')[1]
+
+def test_iso_round_trip():
+	"""
+	Formatting a parsed timestamp gives the text back.
+	"""
+	assert iso_timestamp(*parse_timestamp('2017-11-09T10:00:00-08:00')) == '2017-11-09T10:00:00-08:00'
+
+def test_parse_clock():
+	"""
+	Times of day in the forms the range form accepts.
+	"""
+	assert parse_clock('9am') == (9, 0)
+	assert parse_clock('1:30 pm') == (13, 30)
+	assert parse_clock('12am') == (0, 0)
+	assert parse_clock('13:30') == (13, 30)
+	assert parse_clock('13') is None
+	assert parse_clock('13pm') is None
+	assert parse_us_datetime('12/23/2000 1:30pm') == (2000, 12, 23, 13, 30)
+
+def test_filters():
+	"""
+	Filters take text or arrow objects; fmtdate shows the date.
+	"""
+	assert format_arrow_dateTime('2017-11-09T10:00:00-08:00') == '11/09/2017 10:00'
+	assert format_arrow_dateTime(arrow.get('2017-11-09T10:00:00-08:00')) == '11/09/2017 10:00'
+	assert format_arrow_date('2017-11-09T10:00:00-08:00') == 'Thu 11/09/2017'
+	assert format_arrow_date('garbage') == '(bad date)'
@@ -0,0 +1,88 @@
+from free_cache import FreeTimeCache, fingerprint
+from free_times import calculate_free_daily, wall_seconds, window_filter
+from intervals import Event, Timeline
+from dateutil import tz
+import nose    # Testing framework
+import logging
+
+
+def events(*spans):
+	return [Event.from_record({'id': start, 'etag': '1', 'start': start, 'end': end})
+		for start, end in spans]
+
+CAL_ONE = events(('2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00'), ('2017-11-09T10:30:00-08:00', '2017-11-09T12:00:00-08:00'))
+CAL_TWO = events(('2017-11-09T13:00:00-08:00', '2017-11-09T14:00:00-08:00'))
+DAY = wall_seconds('2017-11-09') // 86400
+BOUNDS = (DAY, DAY, 9 * 3600, 17 * 3600)
+ZONE = tz.gettz('US/Pacific')
+
+
+def test_cached_free_matches():
+	"""
+	Cached results are those of the uncached pipeline.
+	"""
+	cache = FreeTimeCache()
+	contributions = [cache.busy('user', 'one', CAL_ONE, BOUNDS), cache.busy('user', 'two', CAL_TWO, BOUNDS)]
+
+	assert contributions[0][1] == list(window_filter(CAL_ONE, *BOUNDS))
+	assert cache.free(contributions, BOUNDS, ZONE) == calculate_free_daily([CAL_ONE, CAL_TWO], *BOUNDS, tzinfo=ZONE)
+
+def test_calendars_reused():
+	"""
+	Changing the selection only recomputes the new calendar.
+	"""
+	cache = FreeTimeCache()
+	one = cache.busy('user', 'one', CAL_ONE, BOUNDS)
+	cache.free([one], BOUNDS, ZONE)
+	cache.free([cache.busy('user', 'one', CAL_ONE, BOUNDS), cache.busy('user', 'two', CAL_TWO, BOUNDS)], BOUNDS, ZONE)
+	cache.free([cache.busy('user', 'one', CAL_ONE, BOUNDS)], BOUNDS, ZONE)
+
+	assert cache.calendars.misses == 2 and cache.calendars.hits == 2
+	assert cache.results.misses == 2 and cache.results.hits == 1
+
+def test_fingerprint_changes_with_etag():
+	"""
+	An edited event gives a new fingerprint.
+	"""
+	edited = events(('2017-11-09T13:00:00-08:00', '2017-11-09T14:00:00-08:00'))
+	edited[0].etag = '2'
+
+	assert fingerprint('user', 'two', CAL_TWO) != fingerprint('user', 'two', edited)
+	assert fingerprint('user', 'two', CAL_TWO) == fingerprint('user', 'two', events(('2017-11-09T13:00:00-08:00', '2017-11-09T14:00:00-08:00')))
+
+def test_fingerprint_per_user():
+	"""
+	Users sharing a calendar don't share its cache entries.
+	"""
+	cache = FreeTimeCache()
+	cache.busy('alice', 'one', CAL_ONE, BOUNDS)
+	cache.busy('bob', 'one', CAL_ONE, BOUNDS)
+
+	assert fingerprint('alice', 'one', CAL_ONE) != fingerprint('bob', 'one', CAL_ONE)
+	assert cache.calendars.misses == 2 and cache.calendars.hits == 0
+
+class CountingTimeline(Timeline):
+	"""
+	Timeline counting the events read from it.
+	"""
+	reads = 0
+
+	def __iter__(self):
+		for event in super().__iter__():
+			CountingTimeline.reads += 1
+			yield event
+
+def test_timeline_hit_reads_nothing():
+	"""
+	A repeated busy() on the same Timeline is a hit that reads none
+	of its events; a new Timeline is a miss.
+	"""
+	cache = FreeTimeCache()
+	timeline = CountingTimeline(CAL_ONE)
+	first = cache.busy('user', 'one', timeline, BOUNDS)
+	CountingTimeline.reads = 0
+	again = cache.busy('user', 'one', timeline, BOUNDS)
+
+	assert CountingTimeline.reads == 0 and again == first
+	assert cache.busy('user', 'one', Timeline(CAL_ONE), BOUNDS)[1] == first[1]
+	assert cache.calendars.hits == 1 and cache.calendars.misses == 2
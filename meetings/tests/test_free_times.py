@@ -1,4 +1,10 @@
-from free_times import calculate_free
+from free_times import calculate_free, calculate_free_reference, calculate_free_merged, earliest_free
+from free_times import wall_seconds, window_filter, calculate_free_daily, daily_windows
+from intervals import Interval, Timeline
+from dateutil import tz
+import arrow
+import datetime
+import random
 import nose    # Testing framework
 import logging
 
@@ -85,3 +91,196 @@ def test_multiple_blocks():
 
 	assert calculate_free(busy_times, start_time, end_time) == free_times
 
+
+def test_matches_reference():
+	"""
+	Sweep engine agrees with the original implementation wherever
+	that one is right: one event, inside the range or over one end.
+	"""
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+	for start, end in [('10:00', '12:00'), ('08:00', '09:30'), ('15:00', '18:00')]:
+		busy_times = [{'start': '2017-11-09T{}:00-08:00'.format(start), 'end': '2017-11-09T{}:00-08:00'.format(end)}]
+
+		assert calculate_free(busy_times, start_time, end_time) == calculate_free_reference(busy_times, start_time, end_time)
+
+def test_fixes_reference_bugs():
+	"""
+	The original dropped free blocks an event didn't overlap or
+	lined up with exactly, and kept a backwards block for an event
+	covering the whole range; the sweep engine doesn't.
+	"""
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+	apart = [{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T11:00:00-08:00'},
+		{'start': '2017-11-09T13:00:00-08:00', 'end': '2017-11-09T14:00:00-08:00'}]
+	flush = [{'start': '2017-11-09T09:00:00-08:00', 'end': '2017-11-09T10:00:00-08:00'}]
+	covering = [{'start': '2017-11-09T08:00:00-08:00', 'end': '2017-11-09T18:00:00-08:00'}]
+
+	assert calculate_free_reference(apart, start_time, end_time) == [['2017-11-09T11:00:00-08:00', '2017-11-09T13:00:00-08:00'],
+		['2017-11-09T14:00:00-08:00', '2017-11-09T16:00:00-08:00']]
+	assert calculate_free(apart, start_time, end_time) == [['2017-11-09T09:00:00-08:00', '2017-11-09T10:00:00-08:00'],
+		['2017-11-09T11:00:00-08:00', '2017-11-09T13:00:00-08:00'], ['2017-11-09T14:00:00-08:00', '2017-11-09T16:00:00-08:00']]
+	assert calculate_free_reference(flush, start_time, end_time) == []
+	assert calculate_free(flush, start_time, end_time) == [['2017-11-09T10:00:00-08:00', '2017-11-09T16:00:00-08:00']]
+	assert calculate_free_reference(covering, start_time, end_time) == [['2017-11-09T09:00:00-08:00', '2017-11-09T08:00:00-08:00']]
+	assert calculate_free(covering, start_time, end_time) == []
+
+def test_merged_calendars():
+	"""
+	Free times common to two calendars.
+	"""
+	cal_one = [{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T11:00:00-08:00'}, {'start': '2017-11-09T13:00:00-08:00', 'end': '2017-11-09T14:00:00-08:00'}]
+	cal_two = [{'start': '2017-11-09T10:30:00-08:00', 'end': '2017-11-09T12:00:00-08:00'}]
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+	free_times = [['2017-11-09T09:00:00-08:00', '2017-11-09T10:00:00-08:00'], ['2017-11-09T12:00:00-08:00', '2017-11-09T13:00:00-08:00'], ['2017-11-09T14:00:00-08:00', '2017-11-09T16:00:00-08:00']]
+
+	assert calculate_free_merged([cal_one, cal_two], start_time, end_time) == free_times
+	assert calculate_free_merged([cal_one, cal_two], start_time, end_time) == calculate_free(cal_one + cal_two, start_time, end_time)
+
+def test_earliest_free():
+	"""
+	First two free blocks of at least 45 minutes.
+	"""
+	busy_times = [
+	{'start': '2017-11-09T09:30:00-08:00', 'end': '2017-11-09T10:00:00-08:00'},
+	{'start': '2017-11-09T10:30:00-08:00', 'end': '2017-11-09T11:00:00-08:00'},
+	{'start': '2017-11-09T12:00:00-08:00', 'end': '2017-11-09T13:00:00-08:00'},
+	{'start': '2017-11-09T14:00:00-08:00', 'end': '2017-11-09T15:00:00-08:00'}
+	]
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+	free_times = [['2017-11-09T11:00:00-08:00', '2017-11-09T12:00:00-08:00'], ['2017-11-09T13:00:00-08:00', '2017-11-09T14:00:00-08:00']]
+
+	assert list(earliest_free(busy_times, start_time, end_time, 45 * 60, 2)) == free_times
+
+def test_earliest_free_is_lazy():
+	"""
+	Events after the last slot found are not consumed.
+	"""
+	def busy_times():
+		yield {'start': '2017-11-09T09:30:00-08:00', 'end': '2017-11-09T10:00:00-08:00'}
+		yield {'start': '2017-11-09T11:00:00-08:00', 'end': '2017-11-09T12:00:00-08:00'}
+		raise AssertionError("consumed too many events")
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2018-11-09T09:00:00-08:00'
+	free_times = [['2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00']]
+
+	assert list(earliest_free(busy_times(), start_time, end_time, 45 * 60, 1)) == free_times
+
+def test_window_filter():
+	"""
+	Keeps events inside the date range that overlap the daily window.
+	"""
+	events = [
+	{'start': '2017-11-08T10:00:00-08:00', 'end': '2017-11-08T11:00:00-08:00'},
+	{'start': '2017-11-09T07:00:00-08:00', 'end': '2017-11-09T09:30:00-08:00'},
+	{'start': '2017-11-09T18:00:00-08:00', 'end': '2017-11-09T19:00:00-08:00'},
+	{'start': '2017-11-10T16:30:00-08:00', 'end': '2017-11-10T18:00:00-08:00'},
+	{'start': '2017-11-12T10:00:00-08:00', 'end': '2017-11-12T11:00:00-08:00'}
+	]
+	first_day = wall_seconds('2017-11-09T00:00:00-08:00') // 86400
+	last_day = wall_seconds('2017-11-11T00:00:00-08:00') // 86400
+
+	assert list(window_filter(events, first_day, last_day, 9 * 3600, 17 * 3600)) == events[1:2] + events[3:4]
+
+def test_window_filter_matches_arrow():
+	"""
+	Agrees with comparing arrow dates and times event by event.
+	"""
+	random.seed(10)
+	base = arrow.get('2017-11-01T00:00:00-08:00')
+	events = []
+	for event in range(200):
+		start = base.shift(minutes=random.randrange(0, 20 * 24 * 4) * 15)
+		end = start.shift(minutes=random.randrange(1, 40) * 15)
+		events.append({'start': start.isoformat(), 'end': end.isoformat()})
+	events.sort(key=lambda event: event['start'])
+	big_start_date = base.shift(days=5).date()
+	big_end_date = base.shift(days=12).date()
+	big_start_time = base.replace(hour=9).time()
+	big_end_time = base.replace(hour=17).time()
+	expected = []
+	for event in events:
+		e_start = arrow.get(event['start'])
+		e_end = arrow.get(event['end'])
+		date_range = e_end.date() <= big_end_date and e_start.date() >= big_start_date
+		before_lap = e_start.time() < big_start_time and e_end.time() > big_start_time
+		after_lap = e_end.time() > big_end_time and e_start.time() < big_end_time
+		during = e_end.time() <= big_end_time and e_start.time() >= big_start_time
+		if date_range and (before_lap or after_lap or during):
+			expected.append(event)
+	first_day = wall_seconds(base.shift(days=5).isoformat()) // 86400
+	last_day = wall_seconds(base.shift(days=12).isoformat()) // 86400
+
+	assert list(window_filter(events, first_day, last_day, 9 * 3600, 17 * 3600)) == expected
+
+class CountingInterval(Interval):
+	"""
+	Interval counting how often its wall-clock times are worked out.
+	"""
+	__slots__ = ()
+	walls = 0
+
+	def wall(self, seconds):
+		CountingInterval.walls += 1
+		return Interval.wall(self, seconds)
+
+def test_window_filter_timeline():
+	"""
+	A Timeline gives the same events, in several zones, and events
+	well past the range are never looked at.
+	"""
+	random.seed(11)
+	events = []
+	for n in range(400):
+		start = arrow.get('2017-11-01T00:00:00+00:00').shift(minutes=random.randrange(0, 60 * 24 * 4) * 15)
+		zone = random.choice(['-08:00', '+00:00', '+09:00', '+14:00', '-11:00'])
+		start = start.to(zone)
+		events.append(Interval.parse(start.isoformat(), start.shift(minutes=random.randrange(1, 12) * 15).isoformat()))
+	first_day = wall_seconds('2017-11-10T00:00:00-08:00') // 86400
+	last_day = wall_seconds('2017-11-20T00:00:00-08:00') // 86400
+	expected = sorted(window_filter(list(events), first_day, last_day, 9 * 3600, 17 * 3600))
+
+	assert sorted(window_filter(Timeline(events), first_day, last_day, 9 * 3600, 17 * 3600)) == expected
+	late = Timeline(CountingInterval(event.start + 86400 * 100, event.end + 86400 * 100, event.tzinfo)
+		for event in events)
+	CountingInterval.walls = 0
+	list(window_filter(late, first_day, last_day, 9 * 3600, 17 * 3600))
+	assert CountingInterval.walls == 0
+
+def test_free_daily():
+	"""
+	Free times only inside each day's window.
+	"""
+	busy_times = [
+	{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T11:00:00-08:00'},
+	{'start': '2017-11-09T16:00:00-08:00', 'end': '2017-11-10T10:00:00-08:00'}
+	]
+	first_day = wall_seconds('2017-11-09') // 86400
+	free_times = [['2017-11-09T09:00:00-08:00', '2017-11-09T10:00:00-08:00'], ['2017-11-09T11:00:00-08:00', '2017-11-09T16:00:00-08:00'], ['2017-11-10T10:00:00-08:00', '2017-11-10T17:00:00-08:00']]
+
+	assert [gap.isoformat() for gap in calculate_free_daily([busy_times], first_day, first_day + 1, 9 * 3600, 17 * 3600, tz.gettz('US/Pacific'))] == free_times
+
+def test_daily_windows_dst():
+	"""
+	Windows keep wall-clock times across a daylight saving change.
+	"""
+	first_day = wall_seconds('2017-11-04') // 86400
+	windows = list(daily_windows(first_day, first_day + 2, 9 * 3600, 17 * 3600, tz.gettz('US/Pacific')))
+
+	assert [window.start_time().isoformat() for window in windows] == ['2017-11-04T09:00:00-07:00', '2017-11-05T09:00:00-08:00', '2017-11-06T09:00:00-08:00']
+	assert windows[1].start - windows[0].start == 25 * 3600
+
+def test_wall_seconds_zone_rules():
+	"""
+	Input that isn't RFC 3339 (here a datetime in a zone with DST
+	rules) gives the wall-clock time in that zone.
+	"""
+	summer = datetime.datetime(2017, 7, 9, 10, 30, tzinfo=tz.gettz('US/Pacific'))
+	winter = datetime.datetime(2017, 11, 9, 10, 30, tzinfo=tz.gettz('US/Pacific'))
+
+	assert wall_seconds(summer) == wall_seconds('2017-07-09T10:30:00+00:00')
+	assert wall_seconds(winter) % 86400 == 10 * 3600 + 30 * 60
+	assert wall_seconds('2017/07/09 10:30') == wall_seconds('2017-07-09T10:30:00Z')
@@ -0,0 +1,72 @@
+from group_free import find_group_free, group_free
+from free_times import calculate_free_merged
+import nose    # Testing framework
+import logging
+import random
+
+
+def test_group_all_free():
+	"""
+	Everyone must be free.
+	"""
+	alice = [{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T11:00:00-08:00'}]
+	bob = [{'start': '2017-11-09T10:30:00-08:00', 'end': '2017-11-09T12:00:00-08:00'}, {'start': '2017-11-09T13:00:00-08:00', 'end': '2017-11-09T14:00:00-08:00'}]
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+	free_times = [['2017-11-09T09:00:00-08:00', '2017-11-09T10:00:00-08:00'], ['2017-11-09T12:00:00-08:00', '2017-11-09T13:00:00-08:00'], ['2017-11-09T14:00:00-08:00', '2017-11-09T16:00:00-08:00']]
+
+	assert find_group_free([alice, bob], start_time, end_time) == free_times
+
+def test_group_quorum():
+	"""
+	At least two of three attendees free.
+	"""
+	alice = [{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T12:00:00-08:00'}]
+	bob = [{'start': '2017-11-09T11:00:00-08:00', 'end': '2017-11-09T13:00:00-08:00'}]
+	carol = [{'start': '2017-11-09T11:30:00-08:00', 'end': '2017-11-09T14:00:00-08:00'}]
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+	free_times = [['2017-11-09T09:00:00-08:00', '2017-11-09T11:00:00-08:00'], ['2017-11-09T13:00:00-08:00', '2017-11-09T16:00:00-08:00']]
+
+	assert find_group_free([alice, bob, carol], start_time, end_time, quorum=2) == free_times
+
+def test_group_matches_merged():
+	"""
+	Full quorum agrees with the merged calendar sweep.
+	"""
+	random.seed(8)
+	day = 1510243200
+	participants = []
+	for person in range(20):
+		events = []
+		for event in range(5):
+			start = day + random.randrange(0, 40) * 900
+			end = start + random.randrange(1, 8) * 900
+			events.append({'start': start, 'end': end})
+		participants.append(events)
+	start_time = day + 4 * 3600
+	end_time = day + 10 * 3600
+
+	assert find_group_free(participants, start_time, end_time) == calculate_free_merged(participants, start_time, end_time)
+
+def test_group_bad_quorum():
+	"""
+	Quorum larger than the group is rejected.
+	"""
+	try:
+		group_free([[], []], 0, 3600, quorum=3)
+	except ValueError:
+		return
+	assert False
+
+def test_group_no_attendees():
+	"""
+	With nobody to be busy the whole range is free; a quorum makes no
+	sense.
+	"""
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+
+	assert find_group_free([], start_time, end_time) == [[start_time, end_time]]
+	assert group_free([], 100, 100) == []
+	nose.tools.assert_raises(ValueError, group_free, [], 0, 100, 1)
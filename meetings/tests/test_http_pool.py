@@ -0,0 +1,165 @@
+from http_pool import ConnectionPool, PooledHttp
+import nose    # Testing framework
+import logging
+import gzip
+import http.client
+import http.server
+import json
+import threading
+import time
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+	"""
+	Answers with the request line and headers, gzipped if asked.
+	"""
+	protocol_version = 'HTTP/1.1'
+
+	def do_POST(self):
+		self.rfile.read(int(self.headers.get('Content-Length') or 0))
+		self.do_GET()
+
+	def do_GET(self):
+		if self.path == '/slow':
+			time.sleep(0.5)
+		if self.path == '/moved':
+			self.send_response(302)
+			self.send_header('Location', '/landed')
+			self.send_header('Content-Length', '0')
+			self.end_headers()
+			return
+		body = json.dumps({'path': self.path, 'port': self.client_address[1],
+			'user-agent': self.headers.get('User-Agent')}).encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		if 'gzip' in self.headers.get('Accept-Encoding', ''):
+			body = gzip.compress(body)
+			self.send_header('Content-Encoding', 'gzip')
+		self.send_header('Content-Length', str(len(body)))
+		self.send_header('X-Seen', 'one')
+		self.send_header('X-Seen', 'two')
+		self.end_headers()
+		self.wfile.write(body)
+		if self.path == '/drop':
+			# keep-alive as far as the client knows, but hang up
+			self.close_connection = True
+
+	def log_message(self, *args):
+		pass
+
+def serve():
+	server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def test_reuses_connection():
+	"""
+	Requests share a keep-alive connection and get gzip decoded.
+	"""
+	server, url = serve()
+	pool = ConnectionPool()
+	try:
+		first = json.loads(pool.request(url + '/a?fields=items(id)')[1].decode('utf-8'))
+		response, content = pool.request(url + '/b')
+	finally:
+		pool.clear()
+		server.shutdown()
+
+	assert first['path'] == '/a?fields=items(id)' and '(gzip)' in first['user-agent']
+	assert json.loads(content.decode('utf-8'))['port'] == first['port']
+	assert response.status == 200 and response['-content-encoding'] == 'gzip'
+	assert pool.created == 1 and pool.reused == 1
+
+def test_shared_across_threads():
+	"""
+	Threads share the pool without opening more connections than needed.
+	"""
+	server, url = serve()
+	pool = ConnectionPool(maxsize=4)
+	statuses = []
+	def fetch():
+		for n in range(5):
+			statuses.append(pool.request(url + '/x')[0].status)
+	threads = [threading.Thread(target=fetch) for n in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	pool.clear()
+	server.shutdown()
+
+	assert statuses == [200] * 20
+	assert pool.created <= 4 and pool.created + pool.reused == 20
+
+def test_pooled_http_redirect():
+	"""
+	PooledHttp follows redirects like httplib2.Http.
+	"""
+	server, url = serve()
+	try:
+		response, content = PooledHttp(ConnectionPool()).request(url + '/moved')
+	finally:
+		server.shutdown()
+
+	assert json.loads(content.decode('utf-8'))['path'] == '/landed'
+
+def test_no_resend_after_drop():
+	"""
+	A dropped keep-alive connection is retried for GET, not for POST.
+	"""
+	server, url = serve()
+	pool = ConnectionPool()
+	try:
+		pool.request(url + '/drop')
+		time.sleep(0.1)
+		assert pool.request(url + '/again')[0].status == 200
+		assert pool.created == 2
+		pool.request(url + '/drop')
+		time.sleep(0.1)
+		try:
+			pool.request(url + '/token', 'POST', 'grant_type=refresh_token')
+			resent = True
+		except (OSError, http.client.HTTPException):
+			resent = False
+	finally:
+		pool.clear()
+		server.shutdown()
+
+	assert not resent
+
+def test_fork_drops_connections():
+	"""
+	A forked process doesn't use connections its parent left idle.
+	"""
+	server, url = serve()
+	pool = ConnectionPool()
+	try:
+		pool.request(url + '/a')
+		pool._pid = -1    # as if this process were the parent's child
+		pool.request(url + '/b')
+	finally:
+		pool.clear()
+		server.shutdown()
+
+	assert pool.created == 2 and pool.reused == 0
+
+def test_timeout_and_repeated_headers():
+	"""
+	PooledHttp honours its timeout; repeated headers are joined.
+	"""
+	server, url = serve()
+	pool = ConnectionPool()
+	try:
+		response, content = PooledHttp(pool).request(url + '/fast')
+		try:
+			PooledHttp(pool, timeout=0.1).request(url + '/slow')
+			timed_out = False
+		except OSError:
+			timed_out = True
+	finally:
+		pool.clear()
+		server.shutdown()
+
+	assert response['x-seen'] == 'one, two'
+	assert timed_out
@@ -0,0 +1,76 @@
+from interval_index import IntervalIndex
+from free_times import merge_intervals
+from intervals import Interval
+import nose    # Testing framework
+import logging
+import random
+
+
+def blocks(index):
+	return [(interval.start, interval.end) for interval in index.busy(-1, 10 ** 9)]
+
+def merged(spans):
+	return [(interval.start, interval.end) for interval in
+		merge_intervals(Interval(start, end, None) for start, end in sorted(spans.values()))]
+
+
+def test_add_merges_blocks():
+	"""
+	Overlapping and touching events become one block.
+	"""
+	index = IntervalIndex()
+	index.add('a', 100, 200)
+	index.add('b', 300, 400)
+	index.add('c', 200, 300)
+
+	assert blocks(index) == [(100, 400)]
+	assert index.free(0, 500) == [Interval(0, 100, None), Interval(400, 500, None)]
+
+def test_discard_splits_block():
+	"""
+	Removing the event that joined two blocks splits them again.
+	"""
+	index = IntervalIndex()
+	for key, start, end in [('a', 100, 200), ('b', 150, 350), ('c', 300, 400)]:
+		index.add(key, start, end)
+	index.discard('b')
+
+	assert blocks(index) == [(100, 200), (300, 400)]
+	assert index.is_free(200, 300) and not index.is_free(199, 201)
+
+def test_matches_full_merge():
+	"""
+	Random adds, moves and removes give the same busy blocks as
+	merging the whole event list.
+	"""
+	rng = random.Random(7)
+	index = IntervalIndex()
+	spans = {}
+	for step in range(2000):
+		key = rng.randrange(60)
+		if rng.random() < 0.3:
+			index.discard(key)
+			spans.pop(key, None)
+		else:
+			start = rng.randrange(0, 10000, 50)
+			spans[key] = (start, start + rng.randrange(0, 600, 50))
+			index.add(key, *spans[key])
+		assert blocks(index) == merged(spans)
+	assert len(index) == len(spans)
+
+def test_apply_delta():
+	"""
+	Sync-token items add, move and cancel events.
+	"""
+	def item(id, start, end, status='confirmed'):
+		return {'kind': 'calendar#event', 'id': id, 'status': status,
+			'start': {'dateTime': start}, 'end': {'dateTime': end}}
+	index = IntervalIndex()
+	index.apply([item('a', '2017-11-09T10:00:00Z', '2017-11-09T11:00:00Z'),
+		item('b', '2017-11-09T12:00:00Z', '2017-11-09T13:00:00Z')])
+	index.apply([item('a', '2017-11-09T09:00:00Z', '2017-11-09T09:30:00Z'), {'id': 'b', 'status': 'cancelled'}])
+	day = Interval.parse('2017-11-09T08:00:00Z', '2017-11-09T14:00:00Z')
+
+	assert [interval.isoformat() for interval in index.free_windows([day])] == [
+		['2017-11-09T08:00:00+00:00', '2017-11-09T09:00:00+00:00'],
+		['2017-11-09T09:30:00+00:00', '2017-11-09T14:00:00+00:00']]
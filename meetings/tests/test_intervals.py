@@ -0,0 +1,64 @@
+from intervals import Interval, Event
+from free_times import window_filter, wall_seconds, calculate_free
+import nose    # Testing framework
+import logging
+
+
+def test_interval_parse():
+	"""
+	Parsed once into epoch seconds; ISO text comes back unchanged.
+	"""
+	span = Interval.parse('2017-11-09T10:00:00-08:00', '2017-11-09T11:20:00-08:00')
+
+	assert (span.start, span.end) == (1510250400, 1510255200)
+	assert span.duration() == 80 * 60
+	assert span.isoformat() == ['2017-11-09T10:00:00-08:00', '2017-11-09T11:20:00-08:00']
+
+def test_shared_zones():
+	"""
+	Intervals with the same offset share one tzinfo.
+	"""
+	one = Interval.parse('2017-11-09T10:00:00-08:00', '2017-11-09T11:00:00-08:00')
+	two = Interval.parse('2017-11-10T10:00:00-08:00', '2017-11-10T11:00:00-08:00')
+
+	assert one.tzinfo is two.tzinfo
+
+def test_event_reads_like_dict():
+	"""
+	Events keep the fields of list_events' dicts.
+	"""
+	event = Event.from_record({'kind': 'calendar#event', 'id': 'x', 'summary': 'Lunch',
+		'description': '(no description)', 'start': '2017-11-09T12:00:00-08:00',
+		'end': '2017-11-09T13:00:00-08:00'})
+
+	assert event['start'] == '2017-11-09T12:00:00-08:00'
+	assert event['summary'] == 'Lunch' and event.id == 'x'
+
+def test_events_through_engine():
+	"""
+	Events feed the filters and engine like dicts do.
+	"""
+	records = [
+	{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T11:20:00-08:00'},
+	{'start': '2017-11-09T18:00:00-08:00', 'end': '2017-11-09T19:00:00-08:00'}
+	]
+	events = [Event.from_record(record) for record in records]
+	day = wall_seconds('2017-11-09') // 86400
+
+	assert list(window_filter(events, day, day, 9 * 3600, 17 * 3600)) == events[:1]
+	assert calculate_free(events, '2017-11-09T08:00:00-08:00', '2017-11-09T12:00:00-08:00') == calculate_free(records, '2017-11-09T08:00:00-08:00', '2017-11-09T12:00:00-08:00')
+
+def test_equality():
+	"""
+	Events at the same time are equal only if they are the same
+	event, and never equal to a plain Interval.
+	"""
+	record = {'id': 'x', 'start': '2017-11-09T12:00:00-08:00', 'end': '2017-11-09T13:00:00-08:00'}
+	event = Event.from_record(record)
+	other = Event.from_record(dict(record, id='y'))
+	span = Interval.parse(record['start'], record['end'])
+
+	assert event == Event.from_record(record) and event != other
+	assert span != event and event != span
+	assert span == Interval.parse(record['start'], record['end'])
+	assert len({event, other, span}) == 3
@@ -0,0 +1,71 @@
+from loadtest import FakeCalendarServer, DISCOVERY_PATH, run_load, session_cookie, summarize
+from http_pool import ConnectionPool
+from session_store import ServerSideSessionInterface
+import nose    # Testing framework
+import logging
+import json
+import threading
+import flask
+from werkzeug.serving import make_server
+
+
+def get(pool, url):
+	response, content = pool.request(url)
+	return response.status, json.loads(content.decode('utf-8'))
+
+
+def test_fake_events_paged():
+	"""
+	events.list is paged, limited to the range, and ends with a sync token.
+	"""
+	pool = ConnectionPool()
+	with FakeCalendarServer(calendars=1, events=25, days=1, page_size=10) as fake:
+		url = fake.url + '/calendar/v3/calendars/calendar0%40example.com/events'
+		pages = [get(pool, url)[1]]
+		while 'nextPageToken' in pages[-1]:
+			pages.append(get(pool, url + '?pageToken=' + pages[-1]['nextPageToken'])[1])
+		synced = get(pool, url + '?syncToken=' + pages[-1]['nextSyncToken'])[1]
+		narrow = get(pool, url + '?timeMin=2017-11-06T20%3A00%3A00-08%3A00')[1]
+		missing = get(pool, fake.url + '/calendar/v3/calendars/nobody/events')[0]
+		document = get(pool, fake.url + DISCOVERY_PATH)[1]
+	pool.clear()
+
+	assert [len(page['items']) for page in pages] == [10, 10, 5]
+	assert synced['items'] == [] and missing == 404
+	assert 0 < len(narrow['items']) < 10
+	assert fake.requests['events.list'] == 6
+	assert document['rootUrl'] == fake.url + '/'
+	assert set(document['resources']) == {'calendarList', 'events'}
+
+def test_summarize():
+	"""
+	Nearest-rank percentiles, errors and throughput per step.
+	"""
+	samples = [('a', n / 100, n != 7) for n in range(1, 101)]
+	summary = summarize(samples, 2.0)
+
+	assert summary['a']['p50'] == 0.5 and summary['a']['p99'] == 0.99
+	assert summary['a']['errors'] == 1 and summary['all']['rps'] == 50
+
+def test_run_load():
+	"""
+	Simulated users each send their own seeded session.
+	"""
+	app = flask.Flask(__name__)
+	app.session_interface = ServerSideSessionInterface()
+	@app.route('/whoami', methods=['GET', 'POST'])
+	def whoami():
+		return flask.session['user'] if 'user' in flask.session else flask.abort(403)
+	server = make_server('127.0.0.1', 0, app, threaded=True)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	cookies = [session_cookie(app, {'user': 'user{}'.format(n)}) for n in range(3)]
+	try:
+		samples, elapsed = run_load('http://127.0.0.1:{}'.format(server.server_port),
+			[('get', 'GET', '/whoami', None), ('post', 'POST', '/whoami', 'a=1')], cookies, requests=4)
+		anonymous, _ = run_load('http://127.0.0.1:{}'.format(server.server_port),
+			[('get', 'GET', '/whoami', None)], ['session=none'], requests=1)
+	finally:
+		server.shutdown()
+
+	assert len(samples) == 24 and all(ok for name, seconds, ok in samples)
+	assert anonymous == [('get', anonymous[0][1], False)]
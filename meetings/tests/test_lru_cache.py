@@ -0,0 +1,64 @@
+from lru_cache import LRUCache
+import nose    # Testing framework
+import logging
+
+
+class FakeClock:
+	def __init__(self):
+		self.now = 0.0
+
+	def __call__(self):
+		return self.now
+
+
+def test_lru_eviction():
+	"""
+	Least recently used entry is evicted first.
+	"""
+	cache = LRUCache(maxsize=2)
+	cache.put('a', 1)
+	cache.put('b', 2)
+	cache.get('a')
+	cache.put('c', 3)
+
+	assert cache.get('b') is None
+	assert cache.get('a') == 1 and cache.get('c') == 3
+	assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 3, 'misses': 1, 'evictions': 1}
+
+def test_lru_ttl():
+	"""
+	Entries expire after ttl seconds.
+	"""
+	clock = FakeClock()
+	cache = LRUCache(ttl=10, clock=clock)
+	cache.put('a', 1)
+	clock.now = 5
+
+	assert cache.get('a') == 1
+	clock.now = 11
+	assert cache.get('a') is None
+	assert len(cache) == 0
+
+def test_lru_get_or_create():
+	"""
+	Factory only runs on a miss.
+	"""
+	cache = LRUCache()
+	calls = []
+	factory = lambda: calls.append(1) or len(calls)
+
+	assert cache.get_or_create('a', factory) == 1
+	assert cache.get_or_create('a', factory) == 1
+	assert cache.hits == 1 and cache.misses == 1
+
+def test_lru_maxweight():
+	"""
+	Entries are evicted to keep the total weight under maxweight.
+	"""
+	cache = LRUCache(maxsize=10, maxweight=100)
+	cache.put('a', 'x', weight=60)
+	cache.put('b', 'y', weight=30)
+	cache.put('c', 'z', weight=30)
+
+	assert cache.get('a') is None
+	assert cache.weight == 60 and len(cache) == 2
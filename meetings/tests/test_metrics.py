@@ -0,0 +1,62 @@
+from metrics import Counter, Histogram, Registry, span, instrument, STAGE_SECONDS
+import flask
+import nose    # Testing framework
+import logging
+import threading
+
+
+def test_histogram_exposition():
+	"""
+	Histograms come out cumulative, in the Prometheus text format.
+	"""
+	registry = Registry()
+	histogram = registry.register(Histogram('test_seconds', 'Test.', ('stage',), buckets=(0.1, 1.0)))
+	histogram.observe(0.05, 'a')
+	histogram.observe(0.5, 'a')
+	histogram.observe(5, 'a')
+
+	assert registry.exposition() == '\n'.join([
+		'# HELP test_seconds Test.',
+		'# TYPE test_seconds histogram',
+		'test_seconds_bucket{stage="a",le="0.1"} 1',
+		'test_seconds_bucket{stage="a",le="1.0"} 2',
+		'test_seconds_bucket{stage="a",le="+Inf"} 3',
+		'test_seconds_sum{stage="a"} 5.55',
+		'test_seconds_count{stage="a"} 3']) + '\n'
+
+def test_counter_exposition():
+	"""
+	Counters have one line per set of labels.
+	"""
+	registry = Registry()
+	counter = registry.register(Counter('test_total', 'Test.', ('status',)))
+	counter.inc('200')
+	counter.inc('200')
+	counter.inc('500')
+
+	assert registry.exposition().splitlines()[2:] == ['test_total{status="200"} 2', 'test_total{status="500"} 1']
+
+def test_spans_counted():
+	"""
+	Spans are counted in the stage histogram, whether in a request or
+	in a thread outside it.
+	"""
+	app = flask.Flask(__name__)
+	instrument(app)
+
+	@app.route('/work')
+	def work():
+		with span('test_stage'):
+			pass
+		return 'ok'
+
+	client = app.test_client()
+	client.get('/work')
+	def in_thread():
+		with span('test_stage'):
+			pass
+	thread = threading.Thread(target=in_thread)
+	thread.start()
+	thread.join()
+
+	assert any(labels == '{stage="test_stage"}' and value == 2 for name, labels, value in STAGE_SECONDS.samples() if name.endswith('_count'))
@@ -0,0 +1,50 @@
+from recurrence import expand_items
+import nose    # Testing framework
+import logging
+
+
+def item(id, start, end, **fields):
+	return dict({'kind': 'calendar#event', 'id': id, 'status': 'confirmed',
+		'start': start, 'end': end}, **fields)
+
+STANDUP = item('s', {'dateTime': '2017-11-01T09:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+	{'dateTime': '2017-11-01T09:15:00-07:00', 'timeZone': 'America/Los_Angeles'},
+	recurrence=['RRULE:FREQ=DAILY;COUNT=10', 'EXDATE;TZID=America/Los_Angeles:20171106T090000'])
+START = '2017-11-03T00:00:00-07:00'
+END = '2017-11-10T00:00:00-08:00'
+
+def starts(items):
+	return sorted(event['start'].get('dateTime', event['start'].get('date')) for event in items)
+
+
+def test_expand_window_and_dst():
+	"""
+	Only instances in the window, at the same wall-clock time across DST.
+	"""
+	assert starts(expand_items([STANDUP], START, END)) == [
+		'2017-11-03T09:00:00-07:00', '2017-11-04T09:00:00-07:00',
+		'2017-11-05T09:00:00-08:00', '2017-11-07T09:00:00-08:00',
+		'2017-11-08T09:00:00-08:00', '2017-11-09T09:00:00-08:00']
+
+def test_expand_exceptions():
+	"""
+	Moved instances replace their original, cancelled ones are dropped.
+	"""
+	moved = item('s_20171107T170000Z', {'dateTime': '2017-11-07T11:00:00-08:00'},
+		{'dateTime': '2017-11-07T11:15:00-08:00'}, recurringEventId='s',
+		originalStartTime={'dateTime': '2017-11-07T09:00:00-08:00'})
+	cancelled = {'kind': 'calendar#event', 'id': 's_20171108T170000Z', 'status': 'cancelled',
+		'recurringEventId': 's', 'originalStartTime': {'dateTime': '2017-11-08T17:00:00Z'}}
+
+	assert starts(expand_items([STANDUP, moved, cancelled], '2017-11-07T00:00:00-08:00', END)) == [
+		'2017-11-07T11:00:00-08:00', '2017-11-09T09:00:00-08:00']
+
+def test_expand_all_day():
+	"""
+	All-day series expand to dates.
+	"""
+	weekly = item('w', {'date': '2017-11-01'}, {'date': '2017-11-02'}, recurrence=['RRULE:FREQ=WEEKLY'])
+	events = list(expand_items([weekly], START, END))
+
+	assert starts(events) == ['2017-11-08']
+	assert events[0]['end'] == {'date': '2017-11-09'} and events[0]['recurringEventId'] == 'w'
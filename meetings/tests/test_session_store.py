@@ -0,0 +1,96 @@
+from session_store import ServerSideSessionInterface, MemorySessionBackend, SQLiteSessionBackend
+import flask
+import nose    # Testing framework
+import logging
+import os
+import tempfile
+
+
+def make_app(backend):
+	app = flask.Flask(__name__)
+	app.secret_key = 'test'
+	app.session_interface = ServerSideSessionInterface(backend)
+
+	@app.route('/set/<value>')
+	def set_value(value):
+		flask.session['value'] = value
+		flask.session['calendars'] = [{'id': str(n), 'summary': 'x' * 100} for n in range(50)]
+		return 'ok'
+
+	@app.route('/get')
+	def get_value():
+		return flask.session.get('value', '(none)')
+
+	@app.route('/clear')
+	def clear():
+		flask.session.clear()
+		return 'ok'
+
+	return app
+
+
+def test_session_kept_on_server():
+	"""
+	Session data survives requests; the cookie only holds an ID.
+	"""
+	client = make_app(MemorySessionBackend()).test_client()
+	response = client.get('/set/hello')
+
+	assert len(response.headers['Set-Cookie']) < 200
+	assert client.get('/get').data == b'hello'
+
+def test_session_clear():
+	"""
+	Clearing the session removes it from the backend.
+	"""
+	backend = MemorySessionBackend()
+	client = make_app(backend).test_client()
+	client.get('/set/hello')
+	client.get('/clear')
+
+	assert client.get('/get').data == b'(none)'
+	assert len(backend.cache) == 0
+
+def test_sqlite_sessions_shared():
+	"""
+	Two apps (workers) on the same SQLite file share sessions.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'sessions.db')
+		first = make_app(SQLiteSessionBackend(path)).test_client()
+		first.get('/set/shared')
+		second = make_app(SQLiteSessionBackend(path)).test_client()
+		second.set_cookie('session', first.get_cookie('session').value)
+
+		assert second.get('/get').data == b'shared'
+
+def test_sqlite_sessions_expire():
+	"""
+	Expired sessions are not loaded.
+	"""
+	with tempfile.TemporaryDirectory() as directory:
+		backend = SQLiteSessionBackend(os.path.join(directory, 'sessions.db'), ttl=-1)
+		backend.save('abc', {'value': 1})
+
+		assert backend.load('abc') is None
+
+def test_regenerate_on_sign_in():
+	"""
+	Signing in moves the session to a new ID and forgets the old one.
+	"""
+	backend = MemorySessionBackend()
+	app = make_app(backend)
+	@app.route('/signin')
+	def signin():
+		flask.session.regenerate()
+		flask.session['credentials'] = 'token'
+		return 'ok'
+	client = app.test_client()
+	client.get('/set/hello')
+	before = client.get_cookie('session').value
+	response = client.get('/signin')
+	after = client.get_cookie('session').value
+
+	assert after != before and backend.load(before) is None
+	assert client.get('/get').data == b'hello'
+	assert 'Cookie' in response.headers['Vary']
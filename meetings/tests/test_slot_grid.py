@@ -0,0 +1,76 @@
+from slot_grid import calculate_free_grid, busy_grid, free_slots, slot_runs
+from free_times import calculate_free, calculate_free_merged
+from group_free import group_free
+import nose    # Testing framework
+import logging
+import random
+
+
+def test_grid_backend():
+	"""
+	Grid backend gives the interval results on slot-aligned times.
+	"""
+	busy_times = [
+	{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T12:00:00-08:00'},
+	{'start': '2017-11-09T12:30:00-08:00', 'end': '2017-11-09T13:00:00-08:00'},
+	{'start': '2017-11-09T08:00:00-08:00', 'end': '2017-11-09T09:00:00-08:00'},
+	{'start': '2017-11-09T15:00:00-08:00', 'end': '2017-11-09T18:00:00-08:00'}
+	]
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+
+	assert calculate_free(busy_times, start_time, end_time, backend='grid') == calculate_free(busy_times, start_time, end_time)
+
+def test_grid_rounds_out():
+	"""
+	A busy event blocks every slot it touches.
+	"""
+	busy_times = [{'start': '2017-11-09T10:05:00-08:00', 'end': '2017-11-09T10:20:00-08:00'}]
+	start_time = '2017-11-09T10:00:00-08:00'
+	end_time = '2017-11-09T11:10:00-08:00'
+	free_times = [['2017-11-09T10:30:00-08:00', '2017-11-09T11:10:00-08:00']]
+
+	assert calculate_free_grid([busy_times], start_time, end_time, slot=900) == free_times
+
+def test_grid_matches_group():
+	"""
+	Grid quorum agrees with the interval sweep on slot-aligned times.
+	"""
+	random.seed(4)
+	day = 1510243200
+	busy_lists = []
+	for person in range(50):
+		busy = []
+		for event in range(6):
+			start = day + random.randrange(0, 96) * 300
+			busy.append((start, start + random.randrange(1, 12) * 300))
+		busy_lists.append(busy)
+	range_end = day + 8 * 3600
+
+	for quorum in (50, 40, 25):
+		free = free_slots(busy_grid(busy_lists, day, range_end, 300), quorum)
+		assert slot_runs(free, day, range_end, 300) == group_free(busy_lists, day, range_end, quorum)
+
+def test_grid_merged():
+	"""
+	Grid backend is selectable for several calendars.
+	"""
+	cal_one = [{'start': '2017-11-09T10:00:00-08:00', 'end': '2017-11-09T11:00:00-08:00'}]
+	cal_two = [{'start': '2017-11-09T10:30:00-08:00', 'end': '2017-11-09T12:00:00-08:00'}]
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+
+	assert calculate_free_merged([cal_one, cal_two], start_time, end_time, backend='grid') == calculate_free_merged([cal_one, cal_two], start_time, end_time)
+
+def test_backends_agree_without_calendars():
+	"""
+	With no calendars both backends give the whole range; an unknown
+	backend is an error.
+	"""
+	start_time = '2017-11-09T09:00:00-08:00'
+	end_time = '2017-11-09T16:00:00-08:00'
+
+	assert calculate_free_merged([], start_time, end_time, backend='grid') == [[start_time, end_time]]
+	assert calculate_free_merged([], start_time, end_time) == [[start_time, end_time]]
+	nose.tools.assert_raises(ValueError, calculate_free_merged, [], start_time, end_time, backend='gird')
+	nose.tools.assert_raises(ValueError, calculate_free, [], start_time, end_time, backend='gird')
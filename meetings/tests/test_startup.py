@@ -0,0 +1,23 @@
+from startup import LazyModule, import_seconds, import_breakdown
+import nose    # Testing framework
+import logging
+import sys
+
+
+def test_lazy_module():
+	"""
+	The module is only imported on first use.
+	"""
+	sys.modules.pop('colorsys', None)
+	colorsys = LazyModule('colorsys')
+
+	assert not colorsys.loaded and 'colorsys' not in sys.modules
+	assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+	assert colorsys.loaded and colorsys.load() is sys.modules['colorsys']
+
+def test_import_timing():
+	"""
+	Import times come from a fresh interpreter.
+	"""
+	assert 0 < import_seconds(['json'], repeat=1) < 5
+	assert any(name == 'json' for microseconds, name in import_breakdown(['json']))